@@ -0,0 +1,97 @@
+import os
+import re
+import logging
+from functools import lru_cache
+from ab_logging import log
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+encoding_name = os.environ.get("AB_TOKEN_ENCODING", "o200k_base")
+tokens_per_message = 4
+tokens_per_reply = 3
+tokens_per_image = 765
+re_cjk = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        log("token_encoding_unavailable", logging.WARNING, encoding=encoding_name, error=e)
+        return None
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    if (encoding := get_encoding()):
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(re_cjk.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_tokens(text, max_tokens):
+    if count_tokens(text) <= max_tokens:
+        return text
+    if (encoding := get_encoding()):
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    end = len(text) * max_tokens // count_tokens(text)
+    while end and count_tokens(text[:end]) > max_tokens:
+        end = end * 9 // 10
+    return text[:end]
+
+
+def count_message_tokens(message):
+    content = message["content"]
+    return tokens_per_message + count_tokens(content if isinstance(content, str) else str(content))
+
+
+class ChatHistory:
+    def __init__(self, messages, label=""):
+        self.messages = messages
+        self.label = label
+        self.tokens = []
+        self.segments = []
+        self.total_tokens = 0
+        self.editable = ""
+        for message in messages:
+            self.add(message)
+
+    def render(self, message):
+        return f"User:\n{message['content']}" if message["role"] == "user" else f"AI ({self.label}):\n{message['content']}"
+
+    def add(self, message):
+        tokens = count_message_tokens(message)
+        segment = self.render(message)
+        self.editable = f"{self.editable}\n\n{segment}" if self.segments else segment
+        self.tokens.append(tokens)
+        self.segments.append(segment)
+        self.total_tokens += tokens
+
+    def append(self, message):
+        self.messages.append(message)
+        self.add(message)
+
+    def is_current(self, messages):
+        return self.messages is messages and len(self.tokens) == len(messages)
+
+    def set_label(self, label):
+        if label != self.label:
+            self.label = label
+            self.segments = [self.render(message) for message in self.messages]
+            self.editable = "\n\n".join(self.segments)
+
+    def fit(self, budget):
+        if budget is None or self.total_tokens <= budget:
+            return list(self.messages)
+        total, start = self.total_tokens, 0
+        while total > budget and start < len(self.messages):
+            total -= self.tokens[start]
+            start += 1
+        log("chat_history_fitted", budget=budget, tokens=self.total_tokens, fitted_tokens=total, dropped=start)
+        return self.messages[start:]
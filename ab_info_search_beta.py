@@ -2,11 +2,13 @@ import streamlit as st
 import os
 import re
 from pathvalidate import sanitize_filename
-import base64
-import threading
-from ab_time import now_in_filename, scheduled_run
-from ab_utils import clean_yesterday_files
-from ab_tools import get_prompt, get_response_format, get_tools, chat, ai_dict, openrouter, excellence
+import json
+from ab_time import now_in_filename
+from ab_maintenance import start_maintenance
+from ab_tools import get_prompt, get_response_format, get_tools, chat, ai_dict
+from ab_jobs import get_job, pop_submitted_job_ids
+from ab_utils import get_image_data_url
+from ab_history import ChatHistory, count_tokens, count_message_tokens, truncate_tokens, tokens_per_reply, tokens_per_image
 
 st.session_state["ai"] = st.query_params.get("ai", st.session_state.get("ai", "GPT for text chat"))
 st.session_state["chat_history"] = st.session_state.get("chat_history", [{"role": "assistant", "content": "请上传Excel或CSV文件，或者提供你搜索到的文章的URLs"}])
@@ -14,6 +16,7 @@ st.session_state["chat_history_editable"] = st.session_state.get("chat_history_e
 st.session_state["is_chat_history_edited"] = st.session_state.get("is_chat_history_edited", False)
 st.session_state["files_info"] = st.session_state.get("files_info", [])
 st.session_state["doc_content"] = st.session_state.get("doc_content", "")
+st.session_state["job_ids"] = st.session_state.get("job_ids", st.query_params.get_all("job"))
 
 
 def select():
@@ -26,18 +29,28 @@ def update_chat_history():
     return [{"role": "user" if segments[i] == "User:\n" else "assistant", "content": segments[i + 1].strip()} for i in range(len(segments) - 1) if re.match(pattern, segments[i]) and not re.match(pattern, segments[i + 1])]
 
 
+def get_chat_store():
+    store = st.session_state.get("chat_store")
+    if store is None or not store.is_current(st.session_state["chat_history"]):
+        store = st.session_state["chat_store"] = ChatHistory(st.session_state["chat_history"], st.session_state["ai"])
+    store.set_label(st.session_state["ai"])
+    return store
+
+
 def sync_chat_history_editable():
-    return "\n\n".join([f"User:\n{message['content']}" if message["role"] == "user" else f"AI ({st.session_state['ai']}):\n{message['content']}" for message in st.session_state["chat_history"]])
+    return get_chat_store().editable
 
 
 def append_user_message(content):
-    st.session_state["chat_history"].append({"role": "user", "content": content})
-    st.session_state["chat_history_editable"] = sync_chat_history_editable()
+    store = get_chat_store()
+    store.append({"role": "user", "content": content})
+    st.session_state["chat_history_editable"] = store.editable
 
 
 def append_assistant_message(content):
-    st.session_state["chat_history"].append({"role": "assistant", "content": content})
-    st.session_state["chat_history_editable"] = sync_chat_history_editable()
+    store = get_chat_store()
+    store.append({"role": "assistant", "content": content})
+    st.session_state["chat_history_editable"] = store.editable
     st.rerun()
 
 
@@ -53,7 +66,8 @@ def get_file_paths(file):
 
 
 def update_doc_content(contents, cutoff_length):
-    doc_content = f"{st.session_state.get('doc_content')}\n\n{'\n\n'.join(contents[key] for key in sorted(contents))}"
+    new_content = "\n\n".join(contents[key] for key in sorted(contents))
+    doc_content = f"{st.session_state.get('doc_content')}\n\n{new_content}"
     st.session_state["doc_content"] = doc_content[-cutoff_length:]
 
 
@@ -68,15 +82,32 @@ def get_new_files(files):
     return [file for file in files if (file.name, file.size) not in set(st.session_state["files_info"])]
 
 
-def within_length_limit(user_message, results=None):
+def get_context_budget(messages, tools=None):
+    ai = st.session_state["ai"]
+    if ai_dict[ai]["context_tokens"] is None:
+        return None
+    return ai_dict[ai]["context_tokens"] - ai_dict[ai]["reply_tokens"] - tokens_per_reply - sum(count_message_tokens(message) for message in messages) - (count_tokens(json.dumps(tools, ensure_ascii=False)) if tools else 0)
+
+
+def get_text_chat_budget(user_message):
     ai = st.session_state["ai"]
-    max_length = ai_dict[ai]["max_length"]
-    current_length = len(st.session_state["chat_history_editable"]) + len(user_message) + (len(results) if results else 0) + 1000
-    if current_length > max_length:
-        st.warning("Please shorten the chat history to continue the thread.")
+    system_message = get_prompt(ai_dict[ai]["system_message"])
+    tools = get_tools(ai_dict[ai]["tools"])
+    return get_context_budget([{"role": "system", "content": system_message}, {"role": "user", "content": user_message}], tools)
+
+
+def within_length_limit(user_message):
+    budget = get_text_chat_budget(user_message)
+    if budget is None:
+        return True
+    if budget < 0:
+        st.warning("Please shorten the message to continue the thread.")
         return False
-    if current_length > max_length * 0.9:
-        st.warning(f"The thread is approaching the length limit ({current_length}/{max_length}). Consider cutting the chat history or starting a new thread.")
+    history_tokens = get_chat_store().total_tokens
+    if history_tokens > budget:
+        st.warning(f"The thread is over the context budget ({history_tokens}/{budget} tokens), so the oldest messages are left out of the request. Consider starting a new thread.")
+    elif history_tokens > budget * 0.9:
+        st.warning(f"The thread is approaching the context budget ({history_tokens}/{budget} tokens). Consider cutting the chat history or starting a new thread.")
     return True
 
 
@@ -86,15 +117,43 @@ def text_chat(user_message, results=None):
     system_message = get_prompt(ai_dict[ai]["system_message"])
     response_format = get_response_format(ai_dict[ai]["response_format"])
     tools = get_tools(ai_dict[ai]["tools"])
-    messages = [{"role": "system", "content": system_message}] + st.session_state["chat_history"] + ([{"role": "assistant", "content": f"{results}"}] if results else []) + [{"role": "user", "content": user_message}]
-    return chat(llms, messages, response_format=response_format, tools=tools)
+    budget = get_text_chat_budget(user_message)
+    results_messages = []
+    if results:
+        results_messages = [{"role": "assistant", "content": f"{results}" if budget is None else truncate_tokens(f"{results}", max(budget // 2, 0))}]
+        budget = None if budget is None else budget - count_message_tokens(results_messages[0])
+    messages = [{"role": "system", "content": system_message}] + get_chat_store().fit(budget) + results_messages + [{"role": "user", "content": user_message}]
+    return chat(llms, messages, response_format=response_format, tools=tools, ai=ai)
+
+
+def track_submitted_jobs():
+    st.session_state["job_ids"] += pop_submitted_job_ids()
+    st.query_params["job"] = st.session_state["job_ids"]
+
+
+@st.fragment(run_every=2 if st.session_state["job_ids"] else None)
+def show_job_progress():
+    for job_id in list(st.session_state["job_ids"]):
+        job = get_job(job_id)
+        if job is None or job["status"] in ("done", "failed"):
+            st.session_state["job_ids"].remove(job_id)
+            st.query_params["job"] = st.session_state["job_ids"]
+            if job is None:
+                append_assistant_message(f"Job {job_id} is no longer available")
+            elif job["status"] == "done":
+                append_assistant_message(f"Job {job_id} finished: {job['result']}")
+            else:
+                append_assistant_message(f"Job {job_id} failed: {job['error']}")
+        progress = ", ".join(f"{key}: {value}" for key, value in job["progress"].items())
+        st.caption(f"Job {job_id} is {job['status']}{f' ({progress})' if progress else ''}")
 
 
 def images_chat(user_message, image_paths):
     ai = st.session_state["ai"]
     llms = ai_dict[ai]["llms"]
-    messages = st.session_state["chat_history"] + [{"role": "user", "content": [{"type": "text", "text": user_message}, *[{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64.b64encode(open(image_path, 'rb').read()).decode('utf-8')}"}} for image_path in image_paths]]}]
-    return chat(llms, messages)
+    budget = get_context_budget([{"role": "user", "content": user_message}])
+    messages = get_chat_store().fit(None if budget is None else budget - tokens_per_image * len(image_paths)) + [{"role": "user", "content": [{"type": "text", "text": user_message}, *[{"type": "image_url", "image_url": {"url": get_image_data_url(image_path)}} for image_path in image_paths]]}]
+    return chat(llms, messages, ai=ai)
 
 
 st.set_page_config(layout="wide", initial_sidebar_state="expanded")
@@ -140,12 +199,14 @@ if user_message:
             if within_length_limit(user_message):
                 with st.spinner("Let me think... 🧠"):
                     results = text_chat(user_message)
+                    track_submitted_jobs()
                     append_user_message(user_message)
                     if results:
                         if results.startswith("The following dictionary contains the results:\n"):
                             user_message = get_prompt("reply_with_results")
                             with st.spinner("Further processing... 🧠"):
                                 results = text_chat(user_message, results)
+                                track_submitted_jobs()
                                 if results:
                                     append_assistant_message(results)
                         else:
@@ -166,6 +227,7 @@ with chat_view_tab:
                 ai = st.session_state["ai"]
                 with st.chat_message("assistant"):
                     st.write(f"AI ({ai}):\n{content}")
+        show_job_progress()
 
 with editable_view_tab:
     st.text_area("Editable view", height=460, key="chat_history_editable", on_change=is_chat_history_edited, label_visibility="collapsed")
@@ -200,5 +262,4 @@ st.components.v1.html(
     height=0
 )
 
-cleanup_thread = threading.Thread(target=scheduled_run, args=(10, 0, clean_yesterday_files), daemon=True)
-cleanup_thread.start()
+start_maintenance()
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import uuid
+import importlib
+import logging
+import threading
+import multiprocessing
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ab_metrics import reset_job_metrics, write_job_report, write_prometheus_file
+from ab_logging import log, correlation_id
+from ab_scheduler import current_priority, batch_priority
+
+job_workers = int(os.environ.get("AB_JOB_WORKERS", 2))
+default_token_budget = int(os.environ.get("AB_JOB_TOKEN_BUDGET", 0))
+background_tools = {"online_articles_from_url_to_word", "online_articles_from_raw_to_word"}
+
+current_job_id = ContextVar("current_job_id", default=None)
+current_token_budget = ContextVar("current_token_budget", default=0)
+submitted_job_ids = ContextVar("submitted_job_ids", default=())
+
+executor = None
+executor_lock = threading.Lock()
+job_lock = threading.Lock()
+
+
+def get_job_path(job_id):
+    return f"temp-data/job {job_id}.json"
+
+
+def read_job(job_id):
+    try:
+        with open(get_job_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_job(job_id, progress=None, **fields):
+    with job_lock:
+        job = read_job(job_id) or {"job_id": job_id, "progress": {}}
+        job["progress"].update(progress or {})
+        job.update(fields, updated_at=time.time())
+        part_path = f"{get_job_path(job_id)}.{os.getpid()}.part"
+        with open(part_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(part_path, get_job_path(job_id))
+    return job
+
+
+def report_progress(**progress):
+    if job_id := current_job_id.get():
+        update_job(job_id, progress=progress)
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def get_job(job_id):
+    job = read_job(job_id)
+    if job and job["status"] in ("queued", "running") and not is_alive(job["pid"]):
+        job = update_job(job_id, status="failed", error="The job was abandoned by a worker that exited")
+    return job
+
+
+def run_job(job_id, function_name, arguments, token_budget):
+    current_job_id.set(job_id)
+    current_token_budget.set(token_budget)
+    correlation_id.set(job_id)
+    current_priority.set(batch_priority)
+    reset_job_metrics()
+    update_job(job_id, status="running", pid=os.getpid())
+    try:
+        result = getattr(importlib.import_module("ab_tools"), function_name)(**arguments)
+        update_job(job_id, status="done", result=result)
+    except Exception as e:
+        log("job_failed", logging.ERROR, function=function_name, error=e)
+        update_job(job_id, status="failed", error=str(e))
+    finally:
+        write_job_report(job_id)
+        write_prometheus_file()
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ProcessPoolExecutor(job_workers, mp_context=multiprocessing.get_context("spawn"))
+        return executor
+
+
+def on_job_done(job_id, future):
+    global executor
+    if (e := future.exception()) is not None:
+        update_job(job_id, status="failed", error=str(e))
+        if isinstance(e, BrokenProcessPool):
+            with executor_lock:
+                executor = None
+
+
+def submit_job(function_name, arguments, token_budget=default_token_budget):
+    job_id = uuid.uuid4().hex[:12]
+    update_job(job_id, function=function_name, status="queued", pid=os.getpid(), created_at=time.time(), token_budget=token_budget, arguments=arguments)
+    future = get_executor().submit(run_job, job_id, function_name, arguments, token_budget)
+    future.add_done_callback(lambda future: on_job_done(job_id, future))
+    submitted_job_ids.set(submitted_job_ids.get() + (job_id,))
+    return job_id
+
+
+def pop_submitted_job_ids():
+    job_ids = submitted_job_ids.get()
+    submitted_job_ids.set(())
+    return list(job_ids)
@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from ab_metrics import count
+
+log_level = getattr(logging, os.environ.get("AB_LOG_LEVEL", "INFO").upper(), logging.INFO)
+max_field_length = int(os.environ.get("AB_LOG_MAX_FIELD_LENGTH", 300))
+max_queued_records = 10000
+event_sample_rates = {
+    "llm_request": 0.1,
+    "llm_response": 0.1,
+    "scrape_request": 0.1,
+    "upload_blocks_staged": 0.5
+}
+
+correlation_id = ContextVar("correlation_id", default=None)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)),
+            "level": record.levelname,
+            "event": record.msg,
+            "correlation_id": record.correlation_id,
+            "process": record.process,
+            "thread": record.threadName,
+            **record.fields
+        }, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            count("log_records_dropped")
+
+
+def truncate(value):
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    value = str(value)
+    return value if len(value) <= max_field_length else f"{value[:max_field_length]}…(+{len(value) - max_field_length} chars)"
+
+
+stream_handler = logging.StreamHandler(sys.stdout)
+stream_handler.setFormatter(JsonFormatter())
+listener = QueueListener(queue.Queue(max_queued_records), stream_handler)
+logger = logging.getLogger("ab")
+logger.addHandler(DroppingQueueHandler(listener.queue))
+logger.setLevel(log_level)
+logger.propagate = False
+listener.start()
+atexit.register(listener.stop)
+
+
+def log(event, level=logging.INFO, **fields):
+    if not logger.isEnabledFor(level):
+        return
+    if level < logging.WARNING and random.random() >= event_sample_rates.get(event, 1.0):
+        return
+    logger.log(level, event, extra={"fields": {key: truncate(value) for key, value in fields.items()}, "correlation_id": correlation_id.get()})
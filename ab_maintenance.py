@@ -0,0 +1,108 @@
+import os
+import glob
+import time
+import fcntl
+import logging
+import threading
+from ab_jobs import get_job
+from ab_metrics import count
+from ab_logging import log
+
+temp_directories = ["temp-data", "temp-images", "uploaded-files"]
+maintenance_lock_path = "maintenance.lock"
+maintenance_interval_seconds = int(os.environ.get("AB_MAINTENANCE_INTERVAL_SECONDS", 600))
+max_temp_bytes = int(float(os.environ.get("AB_TEMP_MAX_GB", 5)) * 1024 ** 3)
+max_temp_files = int(os.environ.get("AB_TEMP_MAX_FILES", 20000))
+max_temp_age_seconds = int(float(os.environ.get("AB_TEMP_MAX_AGE_HOURS", 24)) * 3600)
+grace_seconds = 600
+
+maintenance_lock_file = None
+maintenance_thread = None
+maintenance_thread_lock = threading.Lock()
+
+
+def get_running_jobs():
+    jobs = []
+    for job_path in glob.glob("temp-data/job *.json"):
+        job = get_job(os.path.basename(job_path)[4:-5])
+        if job and job["status"] in ("queued", "running"):
+            jobs.append(job)
+    return jobs
+
+
+def get_protected_paths(jobs):
+    protected_paths = set()
+    for job in jobs:
+        protected_paths.add(os.path.normpath(f"temp-data/job {job['job_id']}.json"))
+        protected_paths.update(os.path.normpath(value) for value in job.get("arguments", {}).values() if isinstance(value, str))
+    return protected_paths
+
+
+def list_temp_files():
+    temp_files = []
+    for directory in temp_directories:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    temp_files.append((max(stat.st_atime, stat.st_mtime), stat.st_size, os.path.normpath(entry.path)))
+    return temp_files
+
+
+def evict_temp_files(max_bytes=max_temp_bytes, max_files=max_temp_files, max_age_seconds=max_temp_age_seconds):
+    now = time.time()
+    jobs = get_running_jobs()
+    protected_paths = get_protected_paths(jobs)
+    protected_since = min([job["created_at"] for job in jobs] + [now - grace_seconds])
+    temp_files = sorted(list_temp_files())
+    total_bytes, total_files = sum(size for last_used, size, path in temp_files), len(temp_files)
+    reclaimed_bytes, reclaimed_files = 0, 0
+    for last_used, size, path in temp_files:
+        if max_age_seconds < now - last_used or max_bytes < total_bytes - reclaimed_bytes or max_files < total_files - reclaimed_files:
+            if last_used >= protected_since or path in protected_paths:
+                continue
+            try:
+                os.remove(path)
+                reclaimed_bytes += size
+                reclaimed_files += 1
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                log("temp_file_eviction_failed", logging.WARNING, path=path, error=e)
+        else:
+            break
+    count("temp_bytes_reclaimed", reclaimed_bytes)
+    count("temp_files_reclaimed", reclaimed_files)
+    log("temp_files_evicted", files=reclaimed_files, bytes=reclaimed_bytes, remaining_files=total_files - reclaimed_files, remaining_bytes=total_bytes - reclaimed_bytes, running_jobs=len(jobs))
+    return reclaimed_files, reclaimed_bytes
+
+
+def acquire_maintenance_lock():
+    global maintenance_lock_file
+    if maintenance_lock_file is None:
+        lock_file = open(maintenance_lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            maintenance_lock_file = lock_file
+        except OSError:
+            lock_file.close()
+    return maintenance_lock_file is not None
+
+
+def run_maintenance():
+    while True:
+        try:
+            if acquire_maintenance_lock():
+                evict_temp_files()
+        except Exception as e:
+            log("maintenance_failed", logging.ERROR, error=e)
+        time.sleep(maintenance_interval_seconds)
+
+
+def start_maintenance():
+    global maintenance_thread
+    with maintenance_thread_lock:
+        if maintenance_thread is None:
+            maintenance_thread = threading.Thread(target=run_maintenance, name="maintenance", daemon=True)
+            maintenance_thread.start()
+    return maintenance_thread
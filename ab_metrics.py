@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+metrics_directory = os.environ.get("AB_METRICS_DIR", "temp-data")
+samples_per_series = 1000
+
+metrics_lock = threading.Lock()
+process_durations = defaultdict(lambda: deque(maxlen=samples_per_series))
+process_seconds = defaultdict(float)
+process_statuses = defaultdict(int)
+process_counters = defaultdict(float)
+job_durations = defaultdict(list)
+job_statuses = defaultdict(int)
+job_counters = defaultdict(float)
+
+
+def observe(stage, provider, seconds, status):
+    with metrics_lock:
+        process_durations[(stage, provider)].append(seconds)
+        process_seconds[(stage, provider)] += seconds
+        process_statuses[(stage, provider, status)] += 1
+        job_durations[(stage, provider)].append(seconds)
+        job_statuses[(stage, provider, status)] += 1
+
+
+@contextmanager
+def timer(stage, provider=""):
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        observe(stage, provider, time.perf_counter() - start, status)
+
+
+def count(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with metrics_lock:
+        process_counters[key] += value
+        job_counters[key] += value
+
+
+def get_job_count(name):
+    with metrics_lock:
+        return sum(value for (counter_name, labels), value in job_counters.items() if counter_name == name)
+
+
+def get_process_counts(name, label):
+    with metrics_lock:
+        return {dict(labels).get(label): value for (counter_name, labels), value in process_counters.items() if counter_name == name}
+
+
+def get_counters(counters):
+    return [{"name": name, **dict(labels), "value": value} for (name, labels), value in sorted(counters.items())]
+
+
+def get_quantile(sorted_values, quantile):
+    return sorted_values[min(len(sorted_values) - 1, int(quantile * len(sorted_values)))]
+
+
+def summarize(durations, statuses):
+    summaries = []
+    for (stage, provider), values in sorted(durations.items()):
+        sorted_values = sorted(values)
+        summaries.append({
+            "stage": stage,
+            "provider": provider,
+            "count": statuses[(stage, provider, "ok")] + statuses[(stage, provider, "error")],
+            "errors": statuses[(stage, provider, "error")],
+            "seconds": round(sum(values), 3),
+            "p50": round(get_quantile(sorted_values, 0.5), 3),
+            "p95": round(get_quantile(sorted_values, 0.95), 3),
+            "max": round(sorted_values[-1], 3)
+        })
+    return summaries
+
+
+def reset_job_metrics():
+    with metrics_lock:
+        job_durations.clear()
+        job_statuses.clear()
+        job_counters.clear()
+
+
+def write_atomically(path, text):
+    part_path = f"{path}.{os.getpid()}.part"
+    with open(part_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(part_path, path)
+
+
+def write_job_report(job_id):
+    with metrics_lock:
+        report = {"job_id": job_id, "stages": summarize(job_durations, job_statuses), "counters": get_counters(job_counters)}
+    write_atomically(os.path.join(metrics_directory, f"metrics {job_id}.json"), json.dumps(report, ensure_ascii=False, indent=2))
+    return report
+
+
+def get_prometheus_text():
+    process = os.getpid()
+    lines = ["# TYPE ab_stage_seconds summary"]
+    with metrics_lock:
+        summaries = summarize(process_durations, process_statuses)
+        seconds = dict(process_seconds)
+        counters = dict(process_counters)
+        statuses = dict(process_statuses)
+    for summary in summaries:
+        labels = f'stage="{summary["stage"]}",provider="{summary["provider"]}",process="{process}"'
+        lines.append(f'ab_stage_seconds{{{labels},quantile="0.5"}} {summary["p50"]}')
+        lines.append(f'ab_stage_seconds{{{labels},quantile="0.95"}} {summary["p95"]}')
+        lines.append(f"ab_stage_seconds_sum{{{labels}}} {seconds[(summary['stage'], summary['provider'])]:.3f}")
+        lines.append(f"ab_stage_seconds_count{{{labels}}} {summary['count']}")
+    lines.append("# TYPE ab_stage_total counter")
+    for (stage, provider, status), value in sorted(statuses.items()):
+        lines.append(f'ab_stage_total{{stage="{stage}",provider="{provider}",status="{status}",process="{process}"}} {value}')
+    lines.append("# TYPE ab_events_total counter")
+    for (name, labels), value in sorted(counters.items()):
+        labels = "".join(f',{key}="{label}"' for key, label in labels)
+        lines.append(f'ab_events_total{{name="{name}"{labels},process="{process}"}} {value:g}')
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_file():
+    write_atomically(os.path.join(metrics_directory, f"metrics {os.getpid()}.prom"), get_prometheus_text())
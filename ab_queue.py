@@ -0,0 +1,198 @@
+import os
+import ast
+import sys
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import importlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from ab_logging import log
+from ab_metrics import count
+
+queue_path = os.environ.get("AB_QUEUE_PATH", "queue.sqlite")
+lease_seconds = int(os.environ.get("AB_QUEUE_LEASE_SECONDS", 600))
+max_attempts = int(os.environ.get("AB_QUEUE_MAX_ATTEMPTS", 3))
+worker_threads = int(os.environ.get("AB_QUEUE_WORKER_THREADS", 8))
+poll_seconds = 1.0
+queued_functions = {"scrape_web_content", "extract_info_from_online_article"}
+max_unit_age_seconds = 7 * 24 * 3600
+
+connections = threading.local()
+
+
+def get_connection():
+    if getattr(connections, "pid", None) != os.getpid():
+        connection = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("""CREATE TABLE IF NOT EXISTS units (
+            unit_id TEXT PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            function TEXT NOT NULL,
+            arguments TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL,
+            lease_owner TEXT,
+            lease_expires REAL,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )""")
+        connection.execute("CREATE INDEX IF NOT EXISTS units_by_run ON units (run_id, function, status)")
+        connection.execute("CREATE INDEX IF NOT EXISTS units_by_availability ON units (status, available_at)")
+        connections.connection, connections.pid = connection, os.getpid()
+    return connections.connection
+
+
+@contextmanager
+def transaction():
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def enqueue(run_id, function_name, requests):
+    now = time.time()
+    with transaction() as connection:
+        connection.execute("DELETE FROM units WHERE created_at < ?", (now - max_unit_age_seconds,))
+        connection.executemany(
+            "INSERT OR IGNORE INTO units (unit_id, run_id, function, arguments, position, status, available_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+            [(f"{run_id} {function_name} {arguments[0]}", run_id, function_name, repr(tuple(arguments)), position, now, now, now) for position, arguments in enumerate(requests)]
+        )
+
+
+def lease(worker_id, run_id=None):
+    now = time.time()
+    with transaction() as connection:
+        connection.execute(
+            "UPDATE units SET status = 'failed', error = 'The lease expired too many times', updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, max_attempts)
+        )
+        row = connection.execute(
+            "SELECT unit_id, function, arguments, attempts FROM units WHERE (status = 'queued' AND available_at <= ? OR status = 'leased' AND lease_expires < ?)"
+            + (" AND run_id = ?" if run_id else "") + " ORDER BY available_at, position LIMIT 1",
+            (now, now, run_id) if run_id else (now, now)
+        ).fetchone()
+        if row:
+            connection.execute(
+                "UPDATE units SET status = 'leased', attempts = attempts + 1, lease_owner = ?, lease_expires = ?, updated_at = ? WHERE unit_id = ?",
+                (worker_id, now + lease_seconds, now, row[0])
+            )
+    return row and (row[0], row[1], ast.literal_eval(row[2]), row[3] + 1)
+
+
+def complete(unit_id, worker_id, result):
+    with get_connection() as connection:
+        updated = connection.execute(
+            "UPDATE units SET status = 'done', result = ?, error = NULL, lease_owner = ?, updated_at = ? WHERE unit_id = ? AND status != 'done'",
+            (repr(result), worker_id, time.time(), unit_id)
+        ).rowcount
+    count("queue_units", status="done" if updated else "duplicate")
+
+
+def fail(unit_id, worker_id, attempts, error):
+    now = time.time()
+    status = "failed" if attempts >= max_attempts else "queued"
+    with get_connection() as connection:
+        connection.execute(
+            "UPDATE units SET status = ?, error = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE unit_id = ? AND status = 'leased' AND lease_owner = ?",
+            (status, str(error), now + 2 ** attempts, now, unit_id, worker_id)
+        )
+    count("queue_units", status=status if status == "failed" else "retried")
+
+
+def run_unit(worker_id, unit_id, function_name, arguments, attempts):
+    try:
+        if function_name not in queued_functions:
+            raise ValueError(f"{function_name} cannot run from the queue")
+        result = getattr(importlib.import_module("ab_tools"), function_name)(*arguments)
+        complete(unit_id, worker_id, result)
+    except Exception as e:
+        log("queue_unit_failed", logging.WARNING, unit_id=unit_id, attempt=attempts, error=e)
+        fail(unit_id, worker_id, attempts, e)
+
+
+def work(worker_id, run_id=None, stopped=None):
+    worker_id = f"{worker_id} {threading.get_ident()}"
+    while not (stopped and stopped.is_set()):
+        try:
+            unit = lease(worker_id, run_id)
+        except sqlite3.OperationalError as e:
+            log("queue_lease_failed", logging.WARNING, error=e)
+            unit = None
+        if unit:
+            run_unit(worker_id, *unit)
+        elif stopped:
+            stopped.wait(poll_seconds)
+        else:
+            time.sleep(poll_seconds)
+
+
+def get_progress(run_id, function_name):
+    rows = get_connection().execute("SELECT status, COUNT(*) FROM units WHERE run_id = ? AND function = ? GROUP BY status", (run_id, function_name)).fetchall()
+    return dict(rows)
+
+
+def get_results(run_id, function_name):
+    rows = get_connection().execute("SELECT arguments, status, result FROM units WHERE run_id = ? AND function = ? ORDER BY position", (run_id, function_name)).fetchall()
+    return {ast.literal_eval(arguments)[0]: ast.literal_eval(result) if status == "done" else None for arguments, status, result in rows}
+
+
+def delete_run(run_id, function_name):
+    with get_connection() as connection:
+        connection.execute("DELETE FROM units WHERE run_id = ? AND function = ?", (run_id, function_name))
+
+
+def run_queued(run_id, function_name, requests, report=None):
+    requests = list({arguments[0]: arguments for arguments in requests}.values())
+    enqueue(run_id, function_name, requests)
+    stopped = threading.Event()
+    worker_id = f"{socket.gethostname()} {os.getpid()} coordinator"
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(work, worker_id, run_id, stopped), name=f"queue-coordinator-{i}", daemon=True) for i in range(min(worker_threads, len(requests)))]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            progress = get_progress(run_id, function_name)
+            if report:
+                report(progress)
+            if progress.get("done", 0) + progress.get("failed", 0) >= len(requests):
+                break
+            time.sleep(poll_seconds)
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+    results = get_results(run_id, function_name)
+    log("queue_run_finished", run_id=run_id, function=function_name, units=len(requests), failed=progress.get("failed", 0))
+    delete_run(run_id, function_name)
+    return results
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else worker_threads
+    worker_id = f"{socket.gethostname()} {os.getpid()}"
+    log("queue_worker_started", worker_id=worker_id, threads=threads, queue_path=queue_path)
+    for i in range(threads):
+        threading.Thread(target=work, args=(worker_id,), name=f"queue-worker-{i}", daemon=True).start()
+    while True:
+        time.sleep(3600)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from ab_jobs import current_job_id
+from ab_scheduler import current_priority
+from ab_metrics import timer, count
+from ab_logging import log
+
+rate_limit_path = os.environ.get("AB_RATE_LIMIT_PATH", "rate_limits.sqlite")
+default_requests_per_minute = {
+    "firecrawl": 60,
+    "spider": 120,
+    "reader": 120,
+    "llm": 600
+}
+requests_per_minute = {provider: float(os.environ.get(f"AB_RATE_LIMIT_{provider.upper()}", rate)) for provider, rate in default_requests_per_minute.items()}
+burst_requests = float(os.environ.get("AB_RATE_LIMIT_BURST", 5))
+default_retry_after_seconds = 30
+stale_waiter_seconds = 30
+stale_grant_seconds = 3600
+poll_seconds = 0.05
+
+connections = threading.local()
+
+
+def get_connection():
+    if getattr(connections, "pid", None) != os.getpid():
+        connection = sqlite3.connect(rate_limit_path, timeout=60, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, paused_until REAL NOT NULL DEFAULT 0)")
+        connection.execute("CREATE TABLE IF NOT EXISTS waiters (ticket INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, job TEXT NOT NULL, seen_at REAL NOT NULL, priority INTEGER NOT NULL DEFAULT 0)")
+        if "priority" not in [column[1] for column in connection.execute("PRAGMA table_info(waiters)")]:
+            connection.execute("ALTER TABLE waiters ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        connection.execute("CREATE TABLE IF NOT EXISTS grants (key TEXT NOT NULL, job TEXT NOT NULL, granted_at REAL NOT NULL, PRIMARY KEY (key, job))")
+        connection.execute("CREATE INDEX IF NOT EXISTS waiters_by_key ON waiters (key, ticket)")
+        connections.connection, connections.pid = connection, os.getpid()
+    return connections.connection
+
+
+@contextmanager
+def transaction():
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+
+
+def get_key(provider, api_key):
+    return f"{provider} {hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]}"
+
+
+def try_acquire(ticket, key, job, rate):
+    with transaction() as connection:
+        now = time.time()
+        connection.execute("DELETE FROM waiters WHERE key = ? AND seen_at < ?", (key, now - stale_waiter_seconds))
+        connection.execute("UPDATE waiters SET seen_at = ? WHERE ticket = ?", (now, ticket))
+        tokens, updated_at, paused_until = connection.execute("SELECT tokens, updated_at, paused_until FROM buckets WHERE key = ?", (key,)).fetchone() or (burst_requests, now, 0)
+        tokens = min(burst_requests, tokens + max(0, now - updated_at) * rate / 60)
+        wait = max(paused_until - now, (1 - tokens) * 60 / rate)
+        if wait <= 0:
+            next_ticket = connection.execute(
+                "SELECT waiters.ticket FROM waiters LEFT JOIN grants ON grants.key = waiters.key AND grants.job = waiters.job WHERE waiters.key = ? ORDER BY waiters.priority, COALESCE(grants.granted_at, 0), waiters.ticket LIMIT 1",
+                (key,)
+            ).fetchone()
+            if next_ticket is None or next_ticket[0] == ticket:
+                tokens -= 1
+                connection.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+                connection.execute("INSERT OR REPLACE INTO grants (key, job, granted_at) VALUES (?, ?, ?)", (key, job, now))
+            else:
+                wait = poll_seconds
+        connection.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at, paused_until) VALUES (?, ?, ?, ?)", (key, tokens, now, paused_until))
+    return wait
+
+
+def acquire(provider, api_key=""):
+    if not (rate := requests_per_minute.get(provider)):
+        return
+    key = get_key(provider, api_key)
+    job = current_job_id.get() or f"process {os.getpid()}"
+    with timer("rate_limit_wait", provider):
+        ticket = None
+        try:
+            with transaction() as connection:
+                now = time.time()
+                connection.execute("DELETE FROM grants WHERE granted_at < ?", (now - stale_grant_seconds,))
+                ticket = connection.execute("INSERT INTO waiters (key, job, seen_at, priority) VALUES (?, ?, ?, ?)", (key, job, now, current_priority.get())).lastrowid
+            while (wait := try_acquire(ticket, key, job, rate)) > 0:
+                time.sleep(min(wait, 1))
+        except sqlite3.Error as e:
+            log("rate_limit_unavailable", logging.WARNING, provider=provider, error=e)
+            if ticket is not None:
+                get_connection().execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+
+
+def penalize(provider, api_key, seconds):
+    key = get_key(provider, api_key)
+    try:
+        with transaction() as connection:
+            now = time.time()
+            connection.execute(
+                "INSERT INTO buckets (key, tokens, updated_at, paused_until) VALUES (?, 0, ?, ?) ON CONFLICT (key) DO UPDATE SET tokens = 0, updated_at = excluded.updated_at, paused_until = MAX(paused_until, excluded.paused_until)",
+                (key, now, now + seconds)
+            )
+    except sqlite3.Error as e:
+        log("rate_limit_unavailable", logging.WARNING, provider=provider, error=e)
+
+
+def raise_for_rate_limit(provider, api_key, response):
+    if response.status_code == 429:
+        retry_after = response.headers.get("Retry-After", "")
+        seconds = float(retry_after) if retry_after.replace(".", "", 1).isdigit() else default_retry_after_seconds
+        penalize(provider, api_key, seconds)
+        count("rate_limited", provider=provider)
+        log("rate_limited", logging.WARNING, provider=provider, retry_after=seconds)
+        raise Exception(f"{provider} answered 429 Too Many Requests")
@@ -0,0 +1,187 @@
+import os
+import time
+import queue
+import logging
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from ab_metrics import observe, count
+from ab_logging import log
+
+interactive_priority = 0
+batch_priority = 10
+default_lane_workers = {
+    "scrape": 20,
+    "image": 16,
+    "llm": 20,
+    "cpu": os.cpu_count() or 4,
+    "upload": 8
+}
+lane_workers = {lane: int(os.environ.get(f"AB_LANE_{lane.upper()}_WORKERS", workers)) for lane, workers in default_lane_workers.items()}
+
+current_priority = ContextVar("current_priority", default=interactive_priority)
+worker_state = threading.local()
+lanes = {}
+lanes_lock = threading.Lock()
+sequence = itertools.count()
+
+
+class Task:
+    def __init__(self, index, function, arguments, priority, batch):
+        self.index = index
+        self.function = function
+        self.arguments = arguments
+        self.priority = priority
+        self.batch = batch
+        self.context = contextvars.copy_context()
+        self.state = "pending"
+        self.result = self.error = None
+        self.submitted = time.perf_counter()
+        self.started = None
+
+    def run(self, lane):
+        with self.batch.condition:
+            if self.state != "pending":
+                return
+            self.state = "running"
+            self.started = time.perf_counter()
+            self.batch.condition.notify_all()
+        observe("lane_wait", lane, self.started - self.submitted, "ok")
+        try:
+            result, error = self.context.run(self.function, *self.arguments), None
+        except Exception as e:
+            result, error = None, e
+        with self.batch.condition:
+            if self.state == "running":
+                self.state = "done"
+                self.result, self.error = result, error
+                self.batch.finished.append(self)
+                self.batch.condition.notify_all()
+
+
+class Batch:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.finished = deque()
+
+    def next_finished(self, tasks, timeout):
+        with self.condition:
+            while not self.finished:
+                wait = None
+                if timeout is not None:
+                    now = time.perf_counter()
+                    for task in tasks:
+                        if task.state == "running" and now - task.started >= timeout:
+                            task.state = "expired"
+                            return task
+                    deadlines = [task.started + timeout - now for task in tasks if task.state == "running"]
+                    wait = min(deadlines) if deadlines else None
+                self.condition.wait(wait)
+            return self.finished.popleft()
+
+    def cancel(self, tasks):
+        with self.condition:
+            for task in tasks:
+                if task.state == "pending":
+                    task.state = "cancelled"
+
+
+class Lane:
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.queue = queue.PriorityQueue()
+        self.lock = threading.Lock()
+        self.threads = 0
+        self.idle = 0
+        self.backlog = 0
+
+    def put(self, task):
+        with self.lock:
+            if self.idle:
+                self.idle -= 1
+            elif self.threads < self.workers:
+                self.threads += 1
+                threading.Thread(target=self.work, name=f"lane-{self.name}-{self.threads}", daemon=True).start()
+            else:
+                self.backlog += 1
+        self.queue.put((task.priority, next(sequence), task))
+
+    def work(self):
+        worker_state.lane = self.name
+        while True:
+            priority, _, task = self.queue.get()
+            task.run(self.name)
+            with self.lock:
+                if self.backlog:
+                    self.backlog -= 1
+                else:
+                    self.idle += 1
+
+
+def get_lane(name):
+    with lanes_lock:
+        if name not in lanes:
+            lanes[name] = Lane(name, lane_workers.get(name, default_lane_workers["cpu"]))
+        return lanes[name]
+
+
+@contextmanager
+def lane_slot(lane, priority=None):
+    previous_lane = getattr(worker_state, "lane", None)
+    if previous_lane == lane:
+        yield
+        return
+    acquired, released = threading.Event(), threading.Event()
+
+    def hold():
+        acquired.set()
+        released.wait()
+
+    get_lane(lane).put(Task(0, hold, (), current_priority.get() if priority is None else priority, Batch()))
+    acquired.wait()
+    worker_state.lane = lane
+    try:
+        yield
+    finally:
+        worker_state.lane = previous_lane
+        released.set()
+
+
+def as_completed(requests, lane="cpu", priority=None, timeout=None, limit=None):
+    priority = current_priority.get() if priority is None else priority
+    if getattr(worker_state, "lane", None) == lane:
+        for index, (function, *arguments) in enumerate(requests):
+            yield index, function(*arguments), function.__name__, arguments
+        return
+    batch = Batch()
+    pending = deque(enumerate(requests))
+    in_flight = []
+    try:
+        while pending or in_flight:
+            while pending and (limit is None or len(in_flight) < limit):
+                index, (function, *arguments) = pending.popleft()
+                task = Task(index, function, arguments, priority, batch)
+                in_flight.append(task)
+                get_lane(lane).put(task)
+            task = batch.next_finished(in_flight, timeout)
+            in_flight.remove(task)
+            if task.state == "expired":
+                count("lane_tasks", lane=lane, status="timeout")
+                log("lane_task_timed_out", logging.WARNING, lane=lane, function=task.function.__name__, timeout=timeout)
+                yield task.index, None, task.function.__name__, task.arguments
+                continue
+            count("lane_tasks", lane=lane, status="failed" if task.error else "ok")
+            if task.error:
+                raise task.error
+            yield task.index, task.result, task.function.__name__, task.arguments
+    finally:
+        batch.cancel(in_flight)
+
+
+def run_tasks(requests, lane="cpu", priority=None, timeout=None, limit=None):
+    results = sorted(as_completed(requests, lane, priority, timeout, limit), key=lambda result: result[0])
+    return [(result, name, arguments) for index, result, name, arguments in results]
@@ -1,14 +1,21 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 from random import choices
 from string import digits, ascii_lowercase
-import dateparser
-import fcntl
+from functools import lru_cache
+from ab_metrics import count, get_process_counts
+import threading
 import time
+import re
 
 weekdays_en = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
 weekdays_zh = ["一", "二", "三", "四", "五", "六", "日"]
 months_en = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+shanghai = ZoneInfo("Asia/Shanghai")
+re_numeric_date = re.compile(r"(\d{4})([-/.])(\d{1,2})\2(\d{1,2})(?:(?:T|\s+)(\d{1,2}):(\d{2})(?::(\d{2})(?:\.\d+)?)?\s*(Z|[+-]\d{2}:?\d{2})?)?")
+re_chinese_date = re.compile(r"(\d{4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日(?:\s*(\d{1,2}):(\d{2})(?::(\d{2}))?)?")
+re_epoch = re.compile(r"\d{10}|\d{13}")
+parsed_date_path = threading.local()
 
 def now():
     return datetime.now(ZoneInfo("Asia/Shanghai"))
@@ -145,16 +152,66 @@ def get_weekdays_with_dates_zh():
 def get_recent_dates_iso(days):
     return [(now() - timedelta(days=i)).date().isoformat() for i in range(days)]
 
+def iso_date_from_epoch(timestamp):
+    return datetime.fromtimestamp(timestamp / 1000 if timestamp > 1e10 else timestamp, shanghai).date().isoformat()
+
+def iso_date_from_match(year, month, day, hour, minute, second, offset=None):
+    dt = datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+    if offset:
+        offset = "+00:00" if offset == "Z" else offset
+        dt = dt.replace(tzinfo=timezone(int(offset[0] + "1") * timedelta(hours=int(offset[1:3]), minutes=int(offset[-2:])))).astimezone(shanghai)
+    return dt.date().isoformat()
+
+def iso_date_fast_path(text):
+    try:
+        if re_epoch.fullmatch(text):
+            return iso_date_from_epoch(int(text))
+        if match := re_numeric_date.fullmatch(text):
+            year, separator, month, day, *rest = match.groups()
+            return iso_date_from_match(year, month, day, *rest)
+        if match := re_chinese_date.fullmatch(text):
+            return iso_date_from_match(*match.groups())
+    except ValueError:
+        return None
+    return None
+
+@lru_cache(maxsize=4096)
+def parse_date_string(text, today):
+    if (result := iso_date_fast_path(text.strip())) is not None:
+        parsed_date_path.path = "fast"
+        return result
+    parsed_date_path.path = "dateparser"
+    import dateparser
+    dt = dateparser.parse(text, settings={"RETURN_AS_TIMEZONE_AWARE": True, "TIMEZONE": "Asia/Shanghai"})
+    return dt.date().isoformat() if dt else None
+
 def iso_date(timestamp):
     try:
         if isinstance(timestamp, (int, float)):
-            dt = datetime.fromtimestamp(timestamp / 1000 if timestamp > 1e10 else timestamp, ZoneInfo("Asia/Shanghai"))
-        else:
-            dt = dateparser.parse(timestamp, settings={"RETURN_AS_TIMEZONE_AWARE": True, "TIMEZONE": "Asia/Shanghai"})
-        return dt.date().isoformat()
+            count("iso_date", path="epoch")
+            return iso_date_from_epoch(timestamp)
+        parsed_date_path.path = "cache"
+        result = parse_date_string(timestamp, today_iso())
+        count("iso_date", path=parsed_date_path.path)
+        return result or timestamp
     except:
         return timestamp
 
+def iso_dates(timestamps):
+    if hasattr(timestamps, "dropna"):
+        dates = {timestamp: iso_date(timestamp) for timestamp in timestamps.dropna().unique()}
+        return timestamps.map(dates).where(timestamps.notna(), timestamps)
+    return [iso_date(timestamp) for timestamp in timestamps]
+
+def get_iso_date_stats():
+    paths = get_process_counts("iso_date", "path")
+    calls = sum(paths.values())
+    return {
+        **paths,
+        "calls": calls,
+        "fast_path_rate": 1 - paths.get("dateparser", 0) / calls if calls else None
+    }
+
 def year_start(year):
     return (datetime(year, 1, 1, tzinfo=ZoneInfo("Asia/Shanghai"))
             if year <= now().year
@@ -165,19 +222,6 @@ def year_end(year):
             if year < now().year
             else now())
 
-def scheduled_run(start_hour, start_minute, function):
-    try:
-        fcntl.flock(open("lock", "a"), fcntl.LOCK_EX | fcntl.LOCK_NB)
-        next_run = now().replace(hour=start_hour, minute=start_minute, second=0, microsecond=0)
-        if now() > next_run:
-            next_run += timedelta(days=1)
-        while True:
-            time.sleep(max(0, (next_run - now()).total_seconds()))
-            function()
-            next_run += timedelta(days=1)
-    except Exception:
-        return
-
 def interval_run(interval_seconds, function):
     while True:
         time.sleep(interval_seconds)
@@ -9,21 +9,41 @@ import json
 import ast
 from charset_normalizer import detect
 import codecs
-from scraper import scrape_web_contents, parse_web_contents
-from ab_time import now_in_filename, iso_date
+import logging
+from urllib.parse import urlsplit
+from openpyxl import load_workbook
+from scraper import scrape_web_content, scrape_web_contents, parse_web_contents, canonicalize_url
+from near_duplicates import get_signature, cluster_signatures
+from ab_time import now_in_filename, iso_dates
 from ab_utils import manage_thread, upload_to_container
-from export_to_word import export_search_results_to_word, append_company_info_and_disclaimer
+from ab_jobs import background_tools, current_job_id, current_token_budget, submit_job, report_progress
+from ab_metrics import timer, count, get_job_count
+from ab_logging import log
+from ab_scheduler import lane_slot
+from ab_queue import run_queued, new_run_id
+from ab_rate_limiter import acquire, raise_for_rate_limit
+from export_to_word import export_search_results_to_word, shard_workers
 from ab_utils import retrieve
 
-OPENROUTER_API_KEY = retrieve("OpenRouter")
-EXCELLENCE2_API_KEY = retrieve("Excellence2Key")
-EXCELLENCE2_ENDPOINT = retrieve("Excellence2Endpoint")
+openrouter_url = os.environ.get("AB_OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+scrape_interval_seconds = float(os.environ.get("AB_SCRAPE_INTERVAL_SECONDS", 0))
+use_queue = os.environ.get("AB_USE_QUEUE", "") == "1"
+
+
+def get_run_id():
+    return current_job_id.get() or new_run_id()
+
+
+def run_tool(name, arguments):
+    if name in background_tools and not current_job_id.get():
+        return f"Job {submit_job(name, arguments)} is running in the background; its download URL will be posted in the chat when it finishes"
+    return globals().get(name)(**arguments)
 
 
 def execute(tool_calls):
     try:
         results = {
-            f"{name}({arguments})": globals().get(name)(**literal_eval(arguments))
+            f"{name}({arguments})": run_tool(name, literal_eval(arguments))
             for tool_call in tool_calls
             if (function := tool_call.get("function"))
             if (name := function.get("name")) and (arguments := function.get("arguments"))
@@ -31,40 +51,73 @@ def execute(tool_calls):
         }
         return results
     except Exception as e:
-        print(f"Failed to execute tool calls: {e}")
+        log("tool_calls_failed", logging.ERROR, error=e)
         return None
 
 
-def request_llm(url, headers, data, delay=1):
-    for attempt in range(3):
-        try:
-            print(f"Sending request to {url}")
-            response = requests.post(url, headers=headers, json=data, timeout=180).json()
-            print(response)
-            if (message := response.get("choices", [{}])[0].get("message", {})):
-                if (tool_calls := message.get("tool_calls")):
-                    if (results := execute(tool_calls)):
-                        return f"The following dictionary contains the results:\n{results}"
-                elif (content := message.get("content")):
-                    return content
-            raise Exception("Invalid response or execution failed")
-        except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-            if attempt < 2:
-                time.sleep(delay)
-                delay *= 2
-    print("Failed to get a valid response after maximum retries")
+def get_job_tokens():
+    return get_job_count("llm_prompt_tokens") + get_job_count("llm_completion_tokens")
+
+
+def is_over_token_budget():
+    return bool(current_job_id.get() and current_token_budget.get() and get_job_tokens() >= current_token_budget.get())
+
+
+def record_llm_usage(response, provider, model):
+    usage = (response.get("usage") if isinstance(response, dict) else None) or {}
+    prompt_tokens, completion_tokens = usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    count("llm_prompt_tokens", prompt_tokens, provider=provider, model=model)
+    count("llm_completion_tokens", completion_tokens, provider=provider, model=model)
+    return prompt_tokens, completion_tokens
+
+
+def request_llm(url, headers, data, delay=1, model=None):
+    provider = urlsplit(url).netloc
+    model = model or data.get("model", "")
+    api_key = headers.get("Authorization") or headers.get("api-key", "")
+    with timer("llm_call", f"{provider} {model}"):
+        for attempt in range(3):
+            if is_over_token_budget():
+                log("token_budget_exceeded", logging.WARNING, budget=current_token_budget.get(), tokens=get_job_tokens())
+                count("llm_calls", provider=provider, model=model, status="over_budget")
+                return None
+            try:
+                log("llm_request", url=url, model=model, attempt=attempt + 1)
+                count("llm_attempts", provider=provider, model=model)
+                acquire("llm", api_key)
+                with timer("llm", provider):
+                    response = requests.post(url, headers=headers, json=data, timeout=180)
+                raise_for_rate_limit("llm", api_key, response)
+                response = response.json()
+                prompt_tokens, completion_tokens = record_llm_usage(response, provider, model)
+                log("llm_response", url=url, model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, response=response)
+                if (message := response.get("choices", [{}])[0].get("message", {})):
+                    if (tool_calls := message.get("tool_calls")):
+                        if (results := execute(tool_calls)):
+                            count("llm_calls", provider=provider, model=model, status="ok")
+                            return f"The following dictionary contains the results:\n{results}"
+                    elif (content := message.get("content")):
+                        count("llm_calls", provider=provider, model=model, status="ok")
+                        return content
+                raise Exception("Invalid response or execution failed")
+            except Exception as e:
+                log("llm_attempt_failed", logging.WARNING, url=url, model=model, attempt=attempt + 1, error=e)
+                if attempt < 2:
+                    time.sleep(delay)
+                    delay *= 2
+    count("llm_calls", provider=provider, model=model, status="failed")
+    log("llm_failed", logging.ERROR, url=url, model=model)
     return None
 
 
 class LLM:
-    def __init__(self, url, api_key):
+    def __init__(self, url, api_key_name):
         self.url = url
-        self.api_key = api_key
+        self.api_key_name = api_key_name
 
     def __call__(self, messages, model, temperature, top_p, response_format=None, tools=None):
         headers = {
-            "Authorization": f"Bearer {self.api_key}"
+            "Authorization": f"Bearer {retrieve(self.api_key_name)}"
         }
         data = {
             "messages": messages,
@@ -78,14 +131,14 @@ class LLM:
 
 
 class Azure:
-    def __init__(self, endpoint, api_key):
-        self.endpoint = endpoint
-        self.api_key = api_key
+    def __init__(self, endpoint_name, api_key_name):
+        self.endpoint_name = endpoint_name
+        self.api_key_name = api_key_name
 
     def __call__(self, messages, model, temperature, top_p, response_format=None, tools=None):
-        url = f"{self.endpoint}openai/deployments/{model}/chat/completions?api-version=2024-10-21"
+        url = f"{retrieve(self.endpoint_name)}openai/deployments/{model}/chat/completions?api-version=2024-10-21"
         headers = {
-            "api-key": self.api_key
+            "api-key": retrieve(self.api_key_name)
         }
         data = {
             "messages": messages,
@@ -94,11 +147,11 @@ class Azure:
             **({"response_format": response_format} if response_format else {}),
             **({"tools": tools} if tools else {})
         }
-        return request_llm(url, headers, data)
+        return request_llm(url, headers, data, model=model)
 
 
-openrouter = LLM("https://openrouter.ai/api/v1/chat/completions", OPENROUTER_API_KEY)
-excellence2 = Azure(EXCELLENCE2_ENDPOINT, EXCELLENCE2_API_KEY)
+openrouter = LLM(openrouter_url, "OpenRouter")
+excellence2 = Azure("Excellence2Endpoint", "Excellence2Key")
 
 
 def get_prompt(prompt, **arguments):
@@ -121,14 +174,21 @@ def get_tools(tools):
 
 
 class Chat:
-    def __call__(self, llms, messages, response_format=None, tools=None):
+    def __call__(self, llms, messages, response_format=None, tools=None, ai=""):
+        with lane_slot("llm"):
+            return self.request(llms, messages, response_format, tools, ai)
+
+    def request(self, llms, messages, response_format, tools, ai):
         for llm in llms:
             try:
                 results = globals()[llm_dict[llm]["name"]](messages, **llm_dict[llm]["arguments"], response_format=response_format, tools=tools)
                 if results:
+                    count("chat_calls", ai=ai, llm=llm)
                     return results
             except Exception:
-                continue
+                pass
+            count("chat_failovers", ai=ai, llm=llm)
+        count("chat_calls", ai=ai, llm="")
         return None
 
 chat = Chat()
@@ -139,7 +199,7 @@ def text_chat(ai, user_message):
     response_format = get_response_format(ai_dict[ai]["response_format"])
     tools = get_tools(ai_dict[ai]["tools"])
     messages = [{"role": "system", "content": system_message}, {"role": "user", "content": user_message}]
-    return chat(llms, messages, response_format, tools)
+    return chat(llms, messages, response_format, tools, ai)
 
 
 ai_dict = {
@@ -150,7 +210,8 @@ ai_dict = {
         "response_format": None,
         "tools": ["online_articles_from_url_to_word_func", "online_articles_from_raw_to_word_func"],
         "backend_ais": None,
-        "max_length": 128000,
+        "context_tokens": 128000,
+        "reply_tokens": 4096,
         "intro": "OpenAI: GPT-4o"
     },
     "GPT for extracting info from online article": {
@@ -160,7 +221,8 @@ ai_dict = {
         "response_format": "extract_info_from_online_article_json",
         "tools": None,
         "backend_ais": None,
-        "max_length": None,
+        "context_tokens": None,
+        "reply_tokens": None,
         "intro": "internal"
     }
 }
@@ -225,60 +287,167 @@ online_articles_from_raw_to_word_func = {
 
 def search_results_to_csv(search_results):
     csv_path = f"temp-data/{now_in_filename()}.csv"
-    pd.DataFrame(columns=["web_url", "web_raw_content", "heading_1", "heading_2", "source", "published_date", "web_content", "body_content"]).to_csv(csv_path, index=False, encoding="utf-8")
+    pd.DataFrame(columns=["web_url", "canonical_url", "web_raw_content", "heading_1", "heading_2", "source", "published_date", "web_content", "body_content"]).to_csv(csv_path, index=False, encoding="utf-8")
     df = pd.read_csv(csv_path, encoding="utf-8")
-    df = pd.concat([df, pd.DataFrame([{"heading_1": heading_1, "web_url": web_url}
+    df = pd.concat([df, pd.DataFrame([{"heading_1": heading_1, "web_url": web_url, "canonical_url": canonicalize_url(web_url)}
         for heading_1, web_urls in search_results.items()
         for web_url in web_urls]).reindex(columns=df.columns)])
     df.to_csv(csv_path, index=False, encoding="utf-8")
     return csv_path
 
 
-def web_contents_from_url_to_csv(csv_path, urls_per_chunk=6, interval_seconds=5):
-    df = pd.read_csv(csv_path, encoding="utf-8")
+def ensure_canonical_urls(df):
+    df = ensure_columns(df, ["canonical_url"])
+    missing_mask = df["web_url"].notna() & df["canonical_url"].isna()
+    df.loc[missing_mask, "canonical_url"] = df.loc[missing_mask, "web_url"].map(canonicalize_url)
+    return df
+
+
+def web_contents_from_url_to_csv(csv_path, urls_per_chunk=6, interval_seconds=scrape_interval_seconds):
+    df = ensure_canonical_urls(pd.read_csv(csv_path, encoding="utf-8"))
     valid_mask = df["web_url"].notna()
-    web_urls = df[valid_mask]["web_url"].tolist()
-    web_url_chunks = [web_urls[i:i + urls_per_chunk] for i in range(0, len(web_urls), urls_per_chunk)]
-    web_contents = {}
-    for i, web_url_chunk in enumerate(web_url_chunks):
-        web_contents.update(scrape_web_contents(web_url_chunk))
-        if i < len(web_url_chunks) - 1:
-            time.sleep(interval_seconds)
-    df.loc[valid_mask, "web_content"] = df.loc[valid_mask, "web_url"].map(web_contents)
+    representative_urls = df[valid_mask].drop_duplicates("canonical_url").set_index("canonical_url")["web_url"].to_dict()
+    web_urls = list(representative_urls.values())
+    log("scrape_planned", canonical_urls=len(web_urls), rows=int(valid_mask.sum()), duplicate_scrapes_saved=int(valid_mask.sum()) - len(web_urls))
+    if use_queue:
+        web_contents = run_queued(get_run_id(), "scrape_web_content", [(web_url,) for web_url in web_urls], lambda progress: report_progress(stage="scraping", scraped=progress.get("done", 0) + progress.get("failed", 0), total=len(web_urls)))
+    else:
+        web_url_chunks = [web_urls[i:i + urls_per_chunk] for i in range(0, len(web_urls), urls_per_chunk)]
+        web_contents = {}
+        for i, web_url_chunk in enumerate(web_url_chunks):
+            web_contents.update(scrape_web_contents(web_url_chunk))
+            report_progress(stage="scraping", scraped=len(web_contents), total=len(web_urls))
+            if i < len(web_url_chunks) - 1:
+                time.sleep(interval_seconds)
+    df.loc[valid_mask, "web_content"] = df.loc[valid_mask, "canonical_url"].map({canonical_url: web_contents.get(web_url) for canonical_url, web_url in representative_urls.items()})
     df.to_csv(csv_path, index=False, encoding="utf-8")
-    return len(web_urls)
+    return valid_mask.sum()
+
+
+def read_csv_in_chunks(csv_path, rows_per_chunk, encoding="utf-8"):
+    with pd.read_csv(csv_path, encoding=encoding, chunksize=rows_per_chunk) as chunks:
+        yield from chunks
+
+
+def read_excel_in_chunks(excel_path, rows_per_chunk):
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        names = [f"Unnamed: {i}" if column is None else column for i, column in enumerate(header)]
+        header_names, columns, counts = set(names), [], {}
+        for column in names:
+            name, count = column, counts.get(column, 0)
+            while count:
+                counts[column] = count + 1
+                name = f"{column}.{count}"
+                count = count + 1 if name in header_names else counts.get(name, 0)
+            columns.append(name)
+            counts[name] = count + 1
+        start, chunk, blank_rows = 0, [], []
+        for row in rows:
+            if all(value is None for value in row):
+                blank_rows.append(row)
+                continue
+            chunk.extend(blank_rows)
+            blank_rows = []
+            chunk.append(row)
+            if len(chunk) >= rows_per_chunk:
+                yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)))
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns, index=range(start, start + len(chunk)))
+    finally:
+        workbook.close()
+
+
+def read_table_in_chunks(table_path, rows_per_chunk):
+    if table_path.endswith(".csv"):
+        with open(table_path, "rb") as f:
+            encoding = codecs.lookup(detect(f.read(min(32768, os.path.getsize(table_path))))["encoding"] or "utf-8").name
+        return read_csv_in_chunks(table_path, rows_per_chunk, encoding)
+    elif table_path.endswith((".xlsx", ".xls")):
+        return read_excel_in_chunks(table_path, rows_per_chunk)
+    return None
+
+
+def write_csv_chunk(df, csv_path, is_first_chunk):
+    df.to_csv(csv_path, mode="w" if is_first_chunk else "a", header=is_first_chunk, index=False, encoding="utf-8")
+
 
+def ensure_columns(df, columns):
+    for column in columns:
+        if column not in df.columns:
+            df[column] = None
+    return df
 
-def ensure_csv_utf8(table_path):
+
+def ensure_csv_utf8(table_path, rows_per_chunk=500):
     try:
-        if table_path.endswith(".csv"):
-            with open(table_path, "rb") as f:
-                encoding = codecs.lookup(detect(f.read(min(32768, os.path.getsize(table_path))))["encoding"]).name
-            df = pd.read_csv(table_path, encoding=encoding)
-        elif table_path.endswith((".xlsx", ".xls")):
-            df = pd.read_excel(table_path, engine="openpyxl")
-        else:
+        chunks = read_table_in_chunks(table_path, rows_per_chunk)
+        if chunks is None:
             return None
-        first_valid_column = next((column for column in df.columns if pd.notna(column) or df[column].notna().any()), None)
-        if first_valid_column:
+        csv_path = os.path.splitext(table_path)[0] + ".csv"
+        part_path = f"{csv_path}.part"
+        first_valid_column = None
+        for i, df in enumerate(chunks):
+            if i == 0:
+                first_valid_column = next((column for column in df.columns if pd.notna(column) or df[column].notna().any()), None)
+                if not first_valid_column:
+                    break
             empty_mask = df[first_valid_column].isna()
             if empty_mask.any():
                 df.loc[empty_mask, first_valid_column] = df.index[empty_mask]
-            csv_path = os.path.splitext(table_path)[0] + ".csv"
-            df.to_csv(csv_path, index=False, encoding="utf-8")
+            write_csv_chunk(df, part_path, i == 0)
+        if first_valid_column:
+            os.replace(part_path, csv_path)
             return csv_path
     except Exception as e:
-        print(f"Error in ensure_csv_utf8: {e}")
+        log("ensure_csv_utf8_failed", logging.ERROR, table_path=table_path, error=e)
     return None
 
 
-def web_contents_from_raw_to_csv(csv_path):
-    df = pd.read_csv(csv_path, encoding="utf-8")
-    valid_mask = df["web_raw_content"].notna()
-    web_raw_contents = df[valid_mask]["web_raw_content"].tolist()
-    web_contents = parse_web_contents(web_raw_contents)
-    df.loc[valid_mask, "web_content"] = df.loc[valid_mask, "web_raw_content"].map(web_contents)
-    df.to_csv(csv_path, index=False, encoding="utf-8")
+def web_contents_from_raw_to_csv(csv_path, rows_per_chunk=100):
+    part_path = f"{csv_path}.part"
+    parsed_count = 0
+    for i, df in enumerate(read_csv_in_chunks(csv_path, rows_per_chunk)):
+        df = ensure_columns(df, ["web_content"])
+        valid_mask = df["web_raw_content"].notna()
+        web_raw_contents = df[valid_mask]["web_raw_content"].tolist()
+        web_contents = parse_web_contents(web_raw_contents)
+        df.loc[valid_mask, "web_content"] = df.loc[valid_mask, "web_raw_content"].map(web_contents)
+        write_csv_chunk(df, part_path, i == 0)
+        parsed_count += valid_mask.sum()
+        report_progress(stage="parsing", parsed=int(parsed_count))
+    if os.path.exists(part_path):
+        os.replace(part_path, csv_path)
+
+
+def near_duplicates_to_csv(csv_path, rows_per_chunk=100):
+    signatures = {}
+    labels = {}
+    for df in read_csv_in_chunks(csv_path, rows_per_chunk):
+        df = ensure_columns(df, ["web_url", "canonical_url"])
+        for index, web_url, canonical_url, web_content in zip(df.index, df["web_url"], df["canonical_url"], df["web_content"]):
+            key = canonical_url if pd.notna(canonical_url) else index
+            if pd.notna(web_content) and key not in signatures:
+                signatures[key] = get_signature(ast.literal_eval(web_content))
+                labels[key] = web_url if pd.notna(web_url) else f"row {index + 1}"
+    clusters = cluster_signatures(signatures)
+    duplicate_of = {key: labels[cluster[0]] for cluster in clusters for key in cluster[1:]}
+    log("near_duplicates_found", clusters=len(clusters), duplicate_extractions_saved=len(duplicate_of))
+    part_path = f"{csv_path}.part"
+    for i, df in enumerate(read_csv_in_chunks(csv_path, rows_per_chunk)):
+        df = ensure_columns(df, ["web_url", "canonical_url"])
+        keys = [canonical_url if pd.notna(canonical_url) else index for index, canonical_url in zip(df.index, df["canonical_url"])]
+        df["duplicate_of"] = [duplicate_of.get(key) for key in keys]
+        write_csv_chunk(df, part_path, i == 0)
+    if os.path.exists(part_path):
+        os.replace(part_path, csv_path)
+    return duplicate_of
 
 
 def extend_body_content_bounds(web_content, body_content_bounds):
@@ -294,65 +463,88 @@ def extract_info_from_online_article(web_url, web_content, delay=1):
     ai = "GPT for extracting info from online article"
     user_message = f"<web_content>{(dict(list(web_content.items())[:80] + list(web_content.items())[-80:]) if len(web_content) > 160 else web_content)}</web_content>"
     for attempt in range(3):
+        if is_over_token_budget():
+            log("extract_skipped", logging.WARNING, web_url=web_url, reason="token budget exceeded")
+            return None, None, None, None
         try:
-            results = text_chat(ai, user_message)
+            with timer("extract_info_from_online_article"):
+                results = text_chat(ai, user_message)
             results = json.loads(results)
             title = results.get("title")
             source = results.get("source")
-            published_date = iso_date(results.get("published_date"))
+            published_date = results.get("published_date")
             body_content_bounds = results.get("body_content_bounds")
             if title and source and published_date and len(body_content_bounds) == 2:
                 start_bound, end_bound = extend_body_content_bounds(web_content, body_content_bounds)
                 body_content = {key: web_content[key] for key in range(start_bound, end_bound + 1) if key in web_content}
                 return title, source, published_date, body_content
         except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
+            log("extract_attempt_failed", logging.WARNING, web_url=web_url, attempt=attempt + 1, error=e)
             if attempt < 2:
                 time.sleep(delay)
                 delay *= 2
-    print("Failed to extract info after maximum retries")
+    log("extract_failed", logging.ERROR, web_url=web_url)
     return None, None, None, None
 
 
 def extract_info_from_online_articles(web_urls, web_contents):
+    if use_queue:
+        info = run_queued(get_run_id(), "extract_info_from_online_article", list(zip(web_urls, web_contents)), lambda progress: report_progress(extracted=progress.get("done", 0)))
+        return {web_url: values or (None, None, None, None) for web_url, values in info.items()}
     requests = [(extract_info_from_online_article, web_url, web_content) for web_url, web_content in zip(web_urls, web_contents)]
-    return {arguments[0]: result for result, name, arguments in manage_thread(requests)}
+    return {arguments[0]: result for result, name, arguments in manage_thread(requests, lane="llm")}
 
 
 def info_from_web_contents_to_csv(csv_path):
-    df = pd.read_csv(csv_path, encoding="utf-8")
-    valid_mask = df["web_content"].notna()
-    web_urls = df[valid_mask]["web_url"].tolist()
-    web_contents = [ast.literal_eval(web_content) for web_content in df[valid_mask]["web_content"].tolist()]
-    info = extract_info_from_online_articles(web_urls, web_contents)
-    df.loc[valid_mask, "heading_2"] = df.loc[valid_mask, "web_url"].map({web_url: values[0] for web_url, values in info.items()})
-    df.loc[valid_mask, "source"] = df.loc[valid_mask, "web_url"].map({web_url: values[1] for web_url, values in info.items()})
-    df.loc[valid_mask, "published_date"] = df.loc[valid_mask, "web_url"].map({web_url: values[2] for web_url, values in info.items()})
-    df.loc[valid_mask, "body_content"] = df.loc[valid_mask, "web_url"].map({web_url: str(values[3]) if values[3] else None for web_url, values in info.items()})
-    df.to_csv(csv_path, index=False, encoding="utf-8")
-    return df.loc[valid_mask, ["heading_2", "source", "published_date", "body_content"]].notna().all(axis=1).sum()
-
-
-def info_from_web_raw_contents_to_csv(csv_path):
-    df = pd.read_csv(csv_path, encoding="utf-8")
-    valid_mask = df["web_raw_content"].notna()
-    web_urls = df[valid_mask]["web_url"].tolist()
-    web_contents = [ast.literal_eval(web_content) for web_content in df[valid_mask]["web_content"].tolist()]
+    df = ensure_columns(ensure_canonical_urls(pd.read_csv(csv_path, encoding="utf-8")), ["duplicate_of"])
+    valid_mask = df["web_content"].notna() & df["duplicate_of"].isna()
+    unique_df = df[valid_mask].drop_duplicates("canonical_url")
+    web_urls = unique_df["web_url"].tolist()
+    web_contents = [ast.literal_eval(web_content) for web_content in unique_df["web_content"].tolist()]
+    log("extract_planned", canonical_urls=len(web_urls), rows=int(valid_mask.sum()), duplicate_extractions_saved=int(valid_mask.sum()) - len(web_urls))
+    report_progress(stage="extracting")
     info = extract_info_from_online_articles(web_urls, web_contents)
-    df.loc[valid_mask, "heading_2"] = df.loc[valid_mask, "web_url"].map({web_url: values[0] for web_url, values in info.items()})
-    df.loc[valid_mask, "source"] = df.loc[valid_mask, "web_url"].map({web_url: values[1] for web_url, values in info.items()})
-    df.loc[valid_mask, "published_date"] = df.loc[valid_mask, "web_url"].map({web_url: values[2] for web_url, values in info.items()})
-    df.loc[valid_mask, "body_content"] = df.loc[valid_mask, "web_url"].map({web_url: str(values[3]) if values[3] else None for web_url, values in info.items()})
+    report_progress(extracted=sum(values[3] is not None for values in info.values()))
+    info = {canonical_url: info[web_url] for canonical_url, web_url in zip(unique_df["canonical_url"], web_urls)}
+    df.loc[valid_mask, "heading_2"] = df.loc[valid_mask, "canonical_url"].map({canonical_url: values[0] for canonical_url, values in info.items()})
+    df.loc[valid_mask, "source"] = df.loc[valid_mask, "canonical_url"].map({canonical_url: values[1] for canonical_url, values in info.items()})
+    df.loc[valid_mask, "published_date"] = iso_dates(df.loc[valid_mask, "canonical_url"].map({canonical_url: values[2] for canonical_url, values in info.items()}))
+    df.loc[valid_mask, "body_content"] = df.loc[valid_mask, "canonical_url"].map({canonical_url: str(values[3]) if values[3] else None for canonical_url, values in info.items()})
     df.to_csv(csv_path, index=False, encoding="utf-8")
+    complete_mask = valid_mask & df[["heading_2", "source", "published_date", "body_content"]].notna().all(axis=1)
+    return (complete_mask | df["duplicate_of"].isin(df.loc[complete_mask, "web_url"])).sum()
+
+
+def info_from_web_raw_contents_to_csv(csv_path, rows_per_chunk=100):
+    part_path = f"{csv_path}.part"
+    extracted_count = 0
+    for i, df in enumerate(read_csv_in_chunks(csv_path, rows_per_chunk)):
+        df = ensure_columns(df, ["heading_2", "source", "published_date", "body_content", "duplicate_of"])
+        valid_mask = df["web_raw_content"].notna() & df["duplicate_of"].isna()
+        web_urls = df[valid_mask]["web_url"].tolist()
+        web_contents = [ast.literal_eval(web_content) for web_content in df[valid_mask]["web_content"].tolist()]
+        report_progress(stage="extracting")
+        info = extract_info_from_online_articles(web_urls, web_contents)
+        extracted_count += sum(values[3] is not None for values in info.values())
+        report_progress(extracted=extracted_count)
+        df.loc[valid_mask, "heading_2"] = df.loc[valid_mask, "web_url"].map({web_url: values[0] for web_url, values in info.items()})
+        df.loc[valid_mask, "source"] = df.loc[valid_mask, "web_url"].map({web_url: values[1] for web_url, values in info.items()})
+        df.loc[valid_mask, "published_date"] = iso_dates(df.loc[valid_mask, "web_url"].map({web_url: values[2] for web_url, values in info.items()}))
+        df.loc[valid_mask, "body_content"] = df.loc[valid_mask, "web_url"].map({web_url: str(values[3]) if values[3] else None for web_url, values in info.items()})
+        write_csv_chunk(df, part_path, i == 0)
+    if os.path.exists(part_path):
+        os.replace(part_path, csv_path)
 
 
 def online_articles_from_url_to_word(search_results):
     csv_path = search_results_to_csv(search_results)
     web_url_count = web_contents_from_url_to_csv(csv_path)
+    near_duplicates_to_csv(csv_path)
     article_info_count = info_from_web_contents_to_csv(csv_path)
     if web_url_count == article_info_count:
-        doc_path = export_search_results_to_word(csv_path)
-        append_company_info_and_disclaimer(doc_path)
+        report_progress(stage="exporting")
+        doc_path = export_search_results_to_word(csv_path, workers=shard_workers)
+        report_progress(stage="uploading", exported=True)
         return upload_to_container(doc_path)
     else:
         return upload_to_container(csv_path)
@@ -362,9 +554,11 @@ def online_articles_from_raw_to_word(file_path):
     csv_path = ensure_csv_utf8(file_path)
     if csv_path:
         web_contents_from_raw_to_csv(csv_path)
+        near_duplicates_to_csv(csv_path)
         info_from_web_raw_contents_to_csv(csv_path)
-        doc_path = export_search_results_to_word(csv_path)
-        append_company_info_and_disclaimer(doc_path)
+        report_progress(stage="exporting")
+        doc_path = export_search_results_to_word(csv_path, incremental=True)
+        report_progress(stage="uploading", exported=True)
         return upload_to_container(doc_path)
     else:
         return None
@@ -2,69 +2,206 @@ import streamlit as st
 from azure.identity import ClientSecretCredential
 from azure.keyvault.secrets import SecretClient
 from azure.storage.blob import BlobServiceClient
+from azure.core.exceptions import ResourceNotFoundError, HttpResponseError
 import os
-from concurrent.futures import ThreadPoolExecutor
-from pathlib import Path
-from ab_time import hours_ago
+import time
+import base64
+import hashlib
+import logging
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image
+from ab_metrics import timer, count
+from ab_logging import log
+from ab_scheduler import run_tasks
 
 for directory in ["temp-data", "temp-images", "uploaded-files"]:
     os.makedirs(directory, exist_ok=True)
 
-tenant_id = st.secrets["tenant_id"]
-client_id = st.secrets["client_id"]
-client_secret = st.secrets["client_secret"]
-vault_url = st.secrets["vault_url"]
 
-credential = ClientSecretCredential(tenant_id, client_id, client_secret)
-client = SecretClient(vault_url=vault_url, credential=credential)
+@lru_cache(maxsize=None)
+def get_secret_client():
+    credential = ClientSecretCredential(st.secrets["tenant_id"], st.secrets["client_id"], st.secrets["client_secret"])
+    return SecretClient(vault_url=st.secrets["vault_url"], credential=credential)
 
 
+@lru_cache(maxsize=None)
 def retrieve(secret_name):
-    return client.get_secret(secret_name).value
+    return os.environ.get(f"AB_SECRET_{secret_name.upper()}") or get_secret_client().get_secret(secret_name).value
 
 
-YUSISTORAGE_CONNECTION_STRING = retrieve("YusiStorageConnectionString")
+upload_workers = 8
+min_block_size = 1 * 1024 * 1024
+max_block_size = 16 * 1024 * 1024
+uploaded_blobs = {}
+copy_poll_attempts = 60
+image_max_side = 2048
+image_max_short_side = 768
+image_jpeg_quality = 85
+image_mime_types = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp", "GIF": "image/gif"}
 
 
-def manage_thread(requests, thread_count=20):
-    if requests:
-        with ThreadPoolExecutor(min(len(requests), thread_count)) as executor:
-            futures = [(executor.submit(function, *arguments), function, arguments) for function, *arguments in requests]
-            return [(future.result(), function.__name__, arguments) for future, function, arguments in futures]
-    return []
+def manage_thread(requests, thread_count=20, lane="cpu", priority=None, timeout=None):
+    return run_tasks(requests, lane, priority, timeout, thread_count)
 
 
-def upload_to_container(file_path):
+def get_storage_connection_string():
+    return os.environ.get("YUSISTORAGE_CONNECTION_STRING") or retrieve("YusiStorageConnectionString")
+
+
+@lru_cache(maxsize=None)
+def get_blob_service_client(connection_string):
+    return BlobServiceClient.from_connection_string(connection_string)
+
+
+def get_content_hash(file_path):
+    content_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(min_block_size), b""):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def get_block_size(file_size, workers):
+    block_size = -(-file_size // (workers * 4)) // min_block_size * min_block_size
+    return min(max(block_size, min_block_size), max_block_size)
+
+
+def stage_block(blob_client, file_path, block_id, offset, length):
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        blob_client.stage_block(block_id=block_id, data=file.read(length))
+    return block_id
+
+
+def is_uploaded(blob_client, content_hash):
+    try:
+        return blob_client.get_blob_properties().metadata.get("content_sha256") == content_hash
+    except ResourceNotFoundError:
+        return False
+
+
+def find_uploaded_blob(container_client, content_hash):
+    try:
+        for blob in container_client.find_blobs_by_tags(f"\"content_sha256\" = '{content_hash}'"):
+            return container_client.get_blob_client(blob.name).url, True
+        return None, True
+    except Exception as e:
+        log("upload_tag_lookup_failed", logging.WARNING, container=container_client.container_name, error=e)
+        return None, False
+
+
+def copy_uploaded_blob(blob_client, source_url, content_hash):
+    copy_status = blob_client.start_copy_from_url(source_url, metadata={"content_sha256": content_hash}, tags={"content_sha256": content_hash})["copy_status"]
+    for _ in range(copy_poll_attempts):
+        if copy_status != "pending":
+            break
+        time.sleep(1)
+        copy_status = blob_client.get_blob_properties().copy.status
+    if copy_status != "success":
+        raise Exception(f"Copying {source_url} ended as {copy_status}")
+    return blob_client.url
+
+
+def commit_blocks(blob_client, block_ids, content_hash, tags):
+    try:
+        blob_client.commit_block_list(block_ids, metadata={"content_sha256": content_hash}, tags=tags)
+    except HttpResponseError as e:
+        if not tags or e.status_code not in (400, 403):
+            raise
+        log("upload_tags_rejected", logging.WARNING, error=e)
+        blob_client.commit_block_list(block_ids, metadata={"content_sha256": content_hash})
+
+
+def upload_to_container(file_path, connection_string=None, container="temp-data", workers=upload_workers):
+    with timer("upload"):
+        return upload_file_to_container(file_path, connection_string, container, workers)
+
+
+def upload_file_to_container(file_path, connection_string, container, workers):
+    content_hash = get_content_hash(file_path)
+    upload_key = (connection_string, container, content_hash)
+    if upload_key in uploaded_blobs:
+        log("upload_skipped", file_path=file_path, reason="uploaded by this process")
+        return uploaded_blobs[upload_key]
+    file_size = os.path.getsize(file_path)
+    block_size = get_block_size(file_size, workers)
+    blocks = [(f"{content_hash[:16]}-{block_size:08d}-{i:06d}", offset, min(block_size, file_size - offset)) for i, offset in enumerate(range(0, file_size, block_size), 1)]
     for attempt in range(3):
         try:
-            blob_client = BlobServiceClient.from_connection_string(YUSISTORAGE_CONNECTION_STRING).get_blob_client("temp-data", os.path.basename(file_path))
-            chunk_size = 1 * 1024 * 1024
-            block_ids = []
-            with open(file_path, "rb") as file:
-                chunks = iter(lambda: file.read(chunk_size), file.read(0))
-                for i, chunk in enumerate(chunks, 1):
-                    block_id = f"{i:06d}"
-                    block_ids.append(block_id)
-                    blob_client.stage_block(block_id=block_id, data=chunk)
-                    print(f"Block {i} uploaded successfully")
-                blob_client.commit_block_list(block_ids)
-                print("File uploaded successfully")
+            container_client = get_blob_service_client(connection_string or get_storage_connection_string()).get_container_client(container)
+            blob_client = container_client.get_blob_client(os.path.basename(file_path))
+            if is_uploaded(blob_client, content_hash):
+                log("upload_skipped", file_path=file_path, reason="blob has the same content hash")
+                uploaded_blobs[upload_key] = blob_client.url
                 return blob_client.url
+            source_url, tags_supported = find_uploaded_blob(container_client, content_hash)
+            if source_url:
+                try:
+                    copy_uploaded_blob(blob_client, source_url, content_hash)
+                    log("upload_skipped", file_path=file_path, reason="copied a blob with the same content hash tag", source_url=source_url)
+                    uploaded_blobs[upload_key] = blob_client.url
+                    return blob_client.url
+                except Exception as e:
+                    log("upload_copy_failed", logging.WARNING, file_path=file_path, source_url=source_url, error=e)
+            try:
+                staged_block_ids = {block.id for block in blob_client.get_block_list("uncommitted")[1]}
+            except ResourceNotFoundError:
+                staged_block_ids = set()
+            requests = [(stage_block, blob_client, file_path, block_id, offset, length) for block_id, offset, length in blocks if block_id not in staged_block_ids]
+            log("upload_blocks_staged", file_path=file_path, blocks=len(requests), total_blocks=len(blocks), block_kb=block_size // 1024)
+            manage_thread(requests, workers, lane="upload")
+            count("upload_bytes", sum(request[-1] for request in requests))
+            commit_blocks(blob_client, [block_id for block_id, offset, length in blocks], content_hash, {"content_sha256": content_hash} if tags_supported else None)
+            log("upload_succeeded", file_path=file_path, bytes=file_size)
+            uploaded_blobs[upload_key] = blob_client.url
+            return blob_client.url
         except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-    print("Failed to upload file after maximum retries")
+            log("upload_attempt_failed", logging.WARNING, file_path=file_path, attempt=attempt + 1, error=e)
+    log("upload_failed", logging.ERROR, file_path=file_path)
     return None
 
 
-def del_temp_files(cutoff_time):
+def get_image_payload(image_data):
+    image = Image.open(BytesIO(image_data))
+    scale = min(1, image_max_side / max(image.size), image_max_short_side / min(image.size))
+    if scale >= 1 and image.format in image_mime_types:
+        return image_mime_types[image.format], image_data
+    image_format = "PNG" if image.mode in ("RGBA", "LA", "P") or image.format == "PNG" else "JPEG"
+    if scale < 1:
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.Resampling.LANCZOS)
+    buffer = BytesIO()
+    if image_format == "PNG":
+        image.save(buffer, format="PNG", optimize=True)
+    else:
+        image.convert("RGB").save(buffer, format="JPEG", quality=image_jpeg_quality, optimize=True)
+    return image_mime_types[image_format], buffer.getvalue()
+
+
+@lru_cache(maxsize=256)
+def load_image_data_url(image_path, modified_time, size):
+    payload_path = f"temp-data/image {get_content_hash(image_path)} {image_max_side} {image_max_short_side}.txt"
     try:
-        for directory in ["temp-data", "temp-images", "uploaded-files"]:
-            deleted_files = [file.unlink() for file in Path(directory).iterdir() if file.stat().st_ctime < cutoff_time]
-            print(f"Deleted {len(deleted_files)} files from {directory} directory")
-    except Exception as e:
-        print(f"Error in del_temp_files: {e}")
+        with open(payload_path, encoding="utf-8") as f:
+            data_url = f.read()
+        os.utime(payload_path)
+        count("image_payloads", status="reused")
+        return data_url
+    except OSError:
+        pass
+    with open(image_path, "rb") as f:
+        mime_type, image_data = get_image_payload(f.read())
+    data_url = f"data:{mime_type};base64,{base64.b64encode(image_data).decode('utf-8')}"
+    part_path = f"{payload_path}.{os.getpid()}.part"
+    with open(part_path, "w", encoding="utf-8") as f:
+        f.write(data_url)
+    os.replace(part_path, payload_path)
+    count("image_payloads", status="encoded")
+    log("image_payload_encoded", image_path=image_path, size=size, payload_size=len(data_url))
+    return data_url
+
 
+def get_image_data_url(image_path):
+    stat = os.stat(image_path)
+    return load_image_data_url(image_path, stat.st_mtime_ns, stat.st_size)
 
-def clean_yesterday_files():
-    cutoff_time = hours_ago(24).timestamp()
-    del_temp_files(cutoff_time)
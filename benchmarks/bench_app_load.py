@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.fake_providers import FakeProviders, parse_setting
+from benchmarks.bench_pipeline import repo_directory, get_commit
+from ab_metrics import get_quantile
+
+app_path = os.path.join(repo_directory, "ab_info_search_beta.py")
+re_job_finished = re.compile(r"^Job \S+ (?:finished|failed|is no longer available)")
+
+
+def percentile(values, quantile):
+    return round(get_quantile(sorted(values), quantile), 3) if values else None
+
+
+def read_status(pid):
+    status = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                status[name] = value.split()
+    except OSError:
+        pass
+    return int(status.get("Threads", [0])[0]), int(status.get("VmRSS", [0])[0])
+
+
+def get_descendants(pid):
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents.setdefault(int(f.read().rsplit(")", 1)[1].split()[1]), []).append(int(entry))
+            except OSError:
+                continue
+    descendants, pending = [], [pid]
+    while pending:
+        children = parents.get(pending.pop(), [])
+        descendants += children
+        pending += children
+    return descendants
+
+
+class Sampler(threading.Thread):
+    def __init__(self, interval=0.2):
+        super().__init__(name="load-sampler", daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.peak_threads = self.peak_rss_kb = self.peak_processes = 0
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            threads, rss_kb = read_status(os.getpid())
+            descendants = get_descendants(os.getpid())
+            for pid in descendants:
+                rss_kb += read_status(pid)[1]
+            self.peak_threads = max(self.peak_threads, threads)
+            self.peak_rss_kb = max(self.peak_rss_kb, rss_kb)
+            self.peak_processes = max(self.peak_processes, len(descendants) + 1)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_session(level, session, urls_per_job, poll_seconds, timeout):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    start = time.perf_counter()
+    at.run()
+    load_seconds = time.perf_counter() - start
+    web_urls = [f"https://news{i % 7}.example.com/load-{level}-{session}/article-{i}.html" for i in range(urls_per_job)]
+    at.chat_input[0].set_value("请把下面这些文章整理成Word文档：\n" + "\n".join(web_urls))
+    start = time.perf_counter()
+    at.run()
+    submit_seconds = time.perf_counter() - start
+    rerun_seconds = []
+    while not (finished := any(re_job_finished.match(message["content"]) for message in at.session_state["chat_history"] if message["role"] == "assistant")):
+        if time.perf_counter() - start > timeout or at.exception or not at.session_state["job_ids"]:
+            break
+        time.sleep(poll_seconds)
+        rerun_start = time.perf_counter()
+        at.run()
+        rerun_seconds.append(time.perf_counter() - rerun_start)
+    return {
+        "load_seconds": load_seconds,
+        "submit_seconds": submit_seconds,
+        "job_seconds": time.perf_counter() - start if finished else None,
+        "rerun_seconds": rerun_seconds,
+        "succeeded": finished and any(message["content"].startswith("Job ") and " finished: " in message["content"] for message in at.session_state["chat_history"]),
+        "exception": str(at.exception[0].message) if at.exception else None
+    }
+
+
+def run_level(sessions, urls_per_job, poll_seconds, timeout):
+    sampler = Sampler()
+    sampler.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(sessions) as executor:
+        results = list(executor.map(lambda session: run_session(sessions, session, urls_per_job, poll_seconds, timeout), range(sessions)))
+    wall_seconds = time.perf_counter() - start
+    sampler.stop()
+    job_seconds = [result["job_seconds"] for result in results if result["job_seconds"] is not None]
+    return {
+        "sessions": sessions,
+        "succeeded": sum(result["succeeded"] for result in results),
+        "exceptions": [result["exception"] for result in results if result["exception"]],
+        "wall_seconds": round(wall_seconds, 3),
+        "jobs_per_minute": round(sum(result["succeeded"] for result in results) * 60 / wall_seconds, 2),
+        "load_p50": percentile([result["load_seconds"] for result in results], 0.5),
+        "submit_p50": percentile([result["submit_seconds"] for result in results], 0.5),
+        "submit_p95": percentile([result["submit_seconds"] for result in results], 0.95),
+        "job_p50": percentile(job_seconds, 0.5),
+        "job_p95": percentile(job_seconds, 0.95),
+        "rerun_p95": percentile([seconds for result in results for seconds in result["rerun_seconds"]], 0.95),
+        "peak_threads": sampler.peak_threads,
+        "peak_processes": sampler.peak_processes,
+        "peak_rss_mb": round(sampler.peak_rss_kb / 1024, 1)
+    }
+
+
+def find_saturation(levels, gain):
+    for previous, level in zip(levels, levels[1:]):
+        if level["jobs_per_minute"] < previous["jobs_per_minute"] * (1 + gain):
+            return previous["sessions"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent Streamlit sessions of the app through AppTest against local provider stand-ins and find where job throughput stops scaling")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--urls-per-job", type=int, default=10)
+    parser.add_argument("--poll-seconds", type=float, default=2.0, help="How often each session reruns, like the job progress fragment")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--latency-ms", action="append", help="Mean provider latency in ms, either for every provider or as provider=ms (firecrawl, spider, reader, llm, images, blob)")
+    parser.add_argument("--error-rate", action="append", help="Share of provider requests that fail, either for every provider or as provider=rate")
+    parser.add_argument("--gain", type=float, default=0.1, help="A level saturates when doubling sessions adds less than this share of throughput")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--output", help="Write the results as JSON, to compare them across commits")
+    args = parser.parse_args()
+
+    latencies = {provider: ms / 1000 for provider, ms in parse_setting(args.latency_ms or ["50", "llm=500"], 0).items()}
+    fake_providers = FakeProviders(latencies, parse_setting(args.error_rate, 0), port=args.port).start()
+    os.environ.update(fake_providers.get_environment())
+    os.environ.setdefault("AB_LOG_LEVEL", "WARNING")
+    sys.path.insert(0, repo_directory)
+
+    levels = []
+    with tempfile.TemporaryDirectory() as work_directory:
+        os.symlink(os.path.join(repo_directory, "ab_doc_temps"), os.path.join(work_directory, "ab_doc_temps"))
+        os.chdir(work_directory)
+        print(f"{'sessions':>8} {'ok':>4} {'jobs/min':>9} {'submit p50/p95':>15} {'job p50/p95':>15} {'rerun p95':>10} {'threads':>8} {'procs':>6} {'RSS MB':>8}")
+        for sessions in args.sessions:
+            level = run_level(sessions, args.urls_per_job, args.poll_seconds, args.timeout)
+            levels.append(level)
+            submit = f"{level['submit_p50']}/{level['submit_p95']}"
+            job = f"{level['job_p50']}/{level['job_p95']}"
+            print(f"{sessions:>8} {level['succeeded']:>4} {level['jobs_per_minute']:>9} {submit:>15} {job:>15} {str(level['rerun_p95']):>10} {level['peak_threads']:>8} {level['peak_processes']:>6} {level['peak_rss_mb']:>8}")
+            for exception in level["exceptions"]:
+                print(f"    exception: {exception}")
+        os.chdir(repo_directory)
+    fake_providers.stop()
+
+    saturation = find_saturation(levels, args.gain)
+    saturation_text = f"{saturation} sessions" if saturation else "not reached"
+    print(f"saturation: {saturation_text} (AB_JOB_WORKERS={os.environ.get('AB_JOB_WORKERS', 2)})")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"commit": get_commit(), "latencies": latencies, "urls_per_job": args.urls_per_job, "levels": levels, "saturation": saturation}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
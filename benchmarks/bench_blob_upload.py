@@ -0,0 +1,79 @@
+import argparse
+import os
+import tempfile
+import time
+
+azurite_connection_string = "UseDevelopmentStorage=true"
+os.environ.setdefault("YUSISTORAGE_CONNECTION_STRING", azurite_connection_string)
+
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import BlobServiceClient
+from ab_utils import upload_to_container, uploaded_blobs
+from ab_metrics import get_process_counts
+
+
+def get_uploaded_bytes():
+    return sum(get_process_counts("upload_bytes", "").values())
+
+
+def upload_to_container_reference(file_path, connection_string, container):
+    blob_client = BlobServiceClient.from_connection_string(connection_string).get_blob_client(container, os.path.basename(file_path))
+    chunk_size = 1 * 1024 * 1024
+    block_ids = []
+    with open(file_path, "rb") as file:
+        for i, chunk in enumerate(iter(lambda: file.read(chunk_size), b""), 1):
+            block_id = f"{i:06d}"
+            block_ids.append(block_id)
+            blob_client.stage_block(block_id=block_id, data=chunk)
+        blob_client.commit_block_list(block_ids)
+    return blob_client.url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the sequential and the parallel blob uploader against Azurite (azurite-blob --inMemoryPersistence)")
+    parser.add_argument("--connection-string", default=os.environ["YUSISTORAGE_CONNECTION_STRING"])
+    parser.add_argument("--container", default="bench-uploads")
+    parser.add_argument("--megabytes", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    try:
+        BlobServiceClient.from_connection_string(args.connection_string).create_container(args.container)
+    except ResourceExistsError:
+        pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, f"report {time.time_ns()}.docx")
+        with open(file_path, "wb") as f:
+            f.write(os.urandom(args.megabytes * 1024 * 1024))
+
+        start = time.perf_counter()
+        upload_to_container_reference(file_path, args.connection_string, args.container)
+        reference_seconds = time.perf_counter() - start
+
+        os.rename(file_path, file_path := file_path.replace(".docx", " parallel.docx"))
+        start = time.perf_counter()
+        upload_to_container(file_path, args.connection_string, args.container, args.workers)
+        parallel_seconds = time.perf_counter() - start
+
+        uploaded_blobs.clear()
+        start = time.perf_counter()
+        upload_to_container(file_path, args.connection_string, args.container, args.workers)
+        skipped_seconds = time.perf_counter() - start
+
+        os.rename(file_path, renamed_path := file_path.replace(" parallel.docx", " renamed.docx"))
+        uploaded_blobs.clear()
+        uploaded_bytes_before = get_uploaded_bytes()
+        start = time.perf_counter()
+        renamed_url = upload_to_container(renamed_path, args.connection_string, args.container, args.workers)
+        renamed_seconds = time.perf_counter() - start
+
+    print(f"{args.megabytes} MB")
+    print(f"sequential: {reference_seconds:.2f}s")
+    print(f"parallel:   {parallel_seconds:.2f}s ({reference_seconds / parallel_seconds:.1f}x faster)")
+    print(f"unchanged:  {skipped_seconds:.3f}s")
+    print(f"renamed:    {renamed_seconds:.3f}s to {renamed_url} ({'copied an existing blob with the same content hash tag' if uploaded_bytes_before == get_uploaded_bytes() else 'uploaded again'})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import os
+import tempfile
+import time
+from io import BytesIO
+from docx import Document
+from docx.shared import Pt, Inches
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from PIL import Image
+from export_to_word import center_image_description_paragraphs
+
+
+def center_image_description_paragraphs_reference(doc):
+    paragraphs = doc.paragraphs
+    for i, paragraph in enumerate(paragraphs):
+        if any(run.text.strip() == "" and run.element.xpath(".//w:drawing") for run in paragraph.runs):
+            prev_text_paragraph = None
+            j = i - 1
+            while j >= 0:
+                if paragraphs[j].text.strip():
+                    prev_text_paragraph = paragraphs[j]
+                    break
+                j -= 1
+
+            next_text_paragraph = None
+            j = i + 1
+            while j < len(paragraphs):
+                if paragraphs[j].text.strip():
+                    next_text_paragraph = paragraphs[j]
+                    break
+                j += 1
+
+            if prev_text_paragraph and "。" not in prev_text_paragraph.text:
+                prev_text_paragraph.paragraph_format.first_line_indent = Pt(0)
+                prev_text_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+            if next_text_paragraph and "。" not in next_text_paragraph.text:
+                next_text_paragraph.paragraph_format.first_line_indent = Pt(0)
+                next_text_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+
+def build_report(image_path, image_count, gallery_size, paragraphs_per_gallery):
+    doc = Document("ab_doc_temps/info_search_temp_start.docx")
+    for i in range(0, image_count, gallery_size):
+        doc.add_paragraph(f"第{i // gallery_size + 1}篇文章标题")
+        for j in range(paragraphs_per_gallery):
+            paragraph = doc.add_paragraph("这是正文段落，包含句号。" if j % 2 else "图片说明文字")
+            paragraph.paragraph_format.first_line_indent = Pt(24)
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+        for j in range(min(gallery_size, image_count - i)):
+            if j % 7 == 3:
+                doc.add_paragraph("")
+            doc.add_paragraph().add_run().add_picture(image_path, width=Inches(5.0))
+    return doc
+
+
+def get_layout(doc):
+    return [(paragraph.alignment, paragraph.paragraph_format.first_line_indent) for paragraph in doc.paragraphs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare caption centering on an image-heavy report")
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--gallery-size", type=int, default=20)
+    parser.add_argument("--paragraphs-per-gallery", type=int, default=6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        image_path = os.path.join(directory, "image.png")
+        buffer = BytesIO()
+        Image.new("RGB", (64, 48), (120, 160, 200)).save(buffer, format="PNG")
+        with open(image_path, "wb") as f:
+            f.write(buffer.getvalue())
+
+        results = {}
+        for name, function in [("reference", center_image_description_paragraphs_reference), ("linear", center_image_description_paragraphs)]:
+            doc = build_report(image_path, args.images, args.gallery_size, args.paragraphs_per_gallery)
+            start = time.perf_counter()
+            function(doc)
+            results[name] = (time.perf_counter() - start, get_layout(doc))
+
+    if results["reference"][1] != results["linear"][1]:
+        raise SystemExit("Layout mismatch between reference and linear caption centering")
+    reference_seconds, linear_seconds = results["reference"][0], results["linear"][0]
+    print(f"{args.images} images, {len(results['linear'][1])} paragraphs")
+    print(f"reference: {reference_seconds:.3f}s")
+    print(f"linear:    {linear_seconds:.3f}s ({reference_seconds / linear_seconds:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import random
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import pandas as pd
+import ab_time
+import ab_metrics
+from ab_time import iso_date, iso_dates, iso_date_fast_path, get_iso_date_stats
+
+
+def iso_date_reference(timestamp):
+    import dateparser
+    try:
+        if isinstance(timestamp, (int, float)):
+            dt = datetime.fromtimestamp(timestamp / 1000 if timestamp > 1e10 else timestamp, ZoneInfo("Asia/Shanghai"))
+        else:
+            dt = dateparser.parse(timestamp, settings={"RETURN_AS_TIMEZONE_AWARE": True, "TIMEZONE": "Asia/Shanghai"})
+        return dt.date().isoformat()
+    except:
+        return timestamp
+
+
+def get_timestamps(count, seed):
+    rnd = random.Random(seed)
+    timestamps = []
+    for _ in range(count):
+        year, month, day = rnd.randint(2015, 2026), rnd.randint(1, 12), rnd.randint(1, 28)
+        hour, minute, second = rnd.randint(0, 23), rnd.randint(0, 59), rnd.randint(0, 59)
+        separator = rnd.choice("-/.")
+        month_text, day_text = rnd.choice([(f"{month:02d}", f"{day:02d}"), (str(month), str(day))])
+        timestamps.append(rnd.choice([
+            f"{year}-{month:02d}-{day:02d}",
+            f"{year}{separator}{month_text}{separator}{day_text}",
+            f"{year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}",
+            f"{year}-{month:02d}-{day:02d}T{hour:02d}:{minute:02d}:{second:02d}{rnd.choice(['Z', '+00:00', '+08:00', '-05:00', '+0530'])}",
+            f"{year}年{month_text}月{day_text}日",
+            f"{year}年{month}月{day}日 {hour:02d}:{minute:02d}",
+            str(rnd.randint(1_400_000_000, 1_800_000_000)),
+            str(rnd.randint(1_400_000_000_000, 1_800_000_000_000)),
+            rnd.randint(1_400_000_000, 1_800_000_000),
+            rnd.choice(["March 27, 2025", "2025-03-27 星期四", "3 days ago", "20250327", "未知"])
+        ]))
+    return timestamps
+
+
+def check(timestamps):
+    mismatches = 0
+    for timestamp in timestamps:
+        if (isinstance(timestamp, int) or iso_date_fast_path(timestamp.strip()) is not None) and iso_date(timestamp) != iso_date_reference(timestamp):
+            mismatches += 1
+            print(f"Mismatch on {timestamp!r}: {iso_date(timestamp)!r} != {iso_date_reference(timestamp)!r}")
+    if mismatches:
+        raise SystemExit(f"{mismatches} fast-path results differ from dateparser")
+    print(f"check: {len(timestamps)} timestamps, every fast-path result matches dateparser")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the iso_date fast paths against dateparser and compare their throughput")
+    parser.add_argument("--count", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    timestamps = get_timestamps(args.count, args.seed)
+    check(timestamps)
+
+    ab_time.parse_date_string.cache_clear()
+    ab_metrics.process_counters.clear()
+    start = time.perf_counter()
+    reference = [iso_date_reference(timestamp) for timestamp in timestamps]
+    reference_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    tiered = [iso_date(timestamp) for timestamp in timestamps]
+    tiered_seconds = time.perf_counter() - start
+    if reference != tiered:
+        raise SystemExit("Tiered iso_date differs from the dateparser reference")
+    start = time.perf_counter()
+    iso_dates(pd.Series(timestamps * 10, dtype=object))
+    batch_seconds = time.perf_counter() - start
+
+    print(f"dateparser: {reference_seconds * 1e6 / len(timestamps):.1f} µs per timestamp")
+    print(f"tiered:     {tiered_seconds * 1e6 / len(timestamps):.1f} µs per timestamp ({reference_seconds / tiered_seconds:.1f}x faster)")
+    print(f"batch:      {batch_seconds * 1e6 / (len(timestamps) * 10):.1f} µs per timestamp over a column with repeats")
+    print(f"stats:      {get_iso_date_stats()}")
+
+
+if __name__ == "__main__":
+    main()
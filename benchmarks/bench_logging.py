@@ -0,0 +1,50 @@
+import argparse
+import contextlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ab_logging import log, listener, stream_handler
+
+response = {"choices": [{"message": {"content": "会议指出，要加大宏观政策调控力度，着力扩大国内需求。" * 400}}], "usage": {"prompt_tokens": 12000, "completion_tokens": 900}}
+
+
+def print_response(i):
+    print(f"Sending request to https://example.com/{i}")
+    print(response)
+
+
+def log_response(i):
+    log("llm_request", url=f"https://example.com/{i}", attempt=1)
+    log("llm_response", url=f"https://example.com/{i}", prompt_tokens=12000, completion_tokens=900, response=response)
+
+
+def measure(function, calls, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(function, range(calls)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full-payload prints with sampled, queued structured logging under concurrent callers")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull):
+            print_seconds = measure(print_response, args.calls, args.threads)
+        stdout = stream_handler.setStream(devnull)
+        start = time.perf_counter()
+        log_seconds = measure(log_response, args.calls, args.threads)
+        listener.queue.join()
+        drained_seconds = time.perf_counter() - start
+        stream_handler.setStream(stdout)
+
+    print(f"{args.calls} responses of {len(str(response))} characters from {args.threads} threads")
+    print(f"print: {print_seconds * 1e6 / args.calls:.1f} µs per call")
+    print(f"log:   {log_seconds * 1e6 / args.calls:.1f} µs per call ({print_seconds / log_seconds:.1f}x faster), {drained_seconds * 1e6 / args.calls:.1f} µs including the queue drain")
+
+
+if __name__ == "__main__":
+    main()
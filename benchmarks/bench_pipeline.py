@@ -0,0 +1,134 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.fake_providers import FakeProviders, parse_setting
+
+repo_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+flows = ["url", "raw"]
+categories_per_report = 5
+
+
+def get_web_urls(size):
+    return [f"https://news{i % 7}.example.com/{2025 + i % 2}/article-{i}.html" for i in range(size)]
+
+
+def write_raw_table(table_path, size, fake_providers_url):
+    import pandas as pd
+    fake_providers = FakeProviders()
+    fake_providers.url = fake_providers_url
+    pd.DataFrame([{
+        "heading_1": f"Category {i % categories_per_report + 1}",
+        "web_url": web_url,
+        "web_raw_content": fake_providers.get_page(web_url, markdown=False)
+    } for i, web_url in enumerate(get_web_urls(size))]).to_csv(table_path, index=False, encoding="utf-8")
+
+
+def get_peak_rss_mb():
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+    }
+
+
+def run_pipeline(flow, size, fake_providers_url, result_path):
+    import ab_tools
+    from ab_metrics import summarize, get_counters, job_durations, job_statuses, job_counters
+    if flow == "url":
+        web_urls = get_web_urls(size)
+        arguments = ({f"Category {k + 1}": web_urls[k::categories_per_report] for k in range(categories_per_report)},)
+        function = ab_tools.online_articles_from_url_to_word
+    else:
+        table_path = f"uploaded-files/raw {size}.csv"
+        write_raw_table(table_path, size, fake_providers_url)
+        arguments = (table_path,)
+        function = ab_tools.online_articles_from_raw_to_word
+    start = time.perf_counter()
+    download_url = function(*arguments)
+    wall_seconds = time.perf_counter() - start
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "flow": flow,
+            "urls": size,
+            "succeeded": bool(download_url and download_url.endswith(".docx")),
+            "wall_seconds": round(wall_seconds, 3),
+            "peak_rss_mb": get_peak_rss_mb(),
+            "stages": summarize(job_durations, job_statuses),
+            "counters": get_counters(job_counters)
+        }, f, ensure_ascii=False)
+
+
+def run_in_subprocess(flow, size, fake_providers, verbose):
+    with tempfile.TemporaryDirectory() as work_directory:
+        result_path = os.path.join(work_directory, "result.json")
+        os.symlink(os.path.join(repo_directory, "ab_doc_temps"), os.path.join(work_directory, "ab_doc_temps"))
+        environment = {**os.environ, **fake_providers.get_environment(), "PYTHONPATH": repo_directory, "AB_METRICS_DIR": work_directory}
+        environment.setdefault("AB_LOG_LEVEL", "WARNING")
+        environment.setdefault("PYTHONWARNINGS", "ignore::FutureWarning")
+        requests_before, errors_before = fake_providers.get_requests()
+        subprocess.run([sys.executable, "-m", "benchmarks.bench_pipeline", "--run", flow, str(size), fake_providers.url, result_path], cwd=work_directory, env=environment, check=True, stdout=None if verbose else subprocess.DEVNULL)
+        requests_after, errors_after = fake_providers.get_requests()
+        with open(result_path, encoding="utf-8") as f:
+            result = json.load(f)
+    result["requests"] = {provider: value - requests_before.get(provider, 0) for provider, value in requests_after.items() if value > requests_before.get(provider, 0)}
+    result["injected_errors"] = {provider: value - errors_before.get(provider, 0) for provider, value in errors_after.items() if value > errors_before.get(provider, 0)}
+    return result
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repo_directory, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result, baseline):
+    stages = [f"{stage['stage']} {stage['provider']}".strip() + f" {stage['seconds']}s" for stage in sorted(result["stages"], key=lambda stage: -stage["seconds"])[:6]]
+    comparison = ""
+    if (previous := baseline.get((result["flow"], result["urls"]))):
+        comparison = f" ({previous['wall_seconds'] / result['wall_seconds']:.2f}x vs baseline {previous['wall_seconds']:.2f}s)"
+    print(f"{result['flow']:>3} {result['urls']:>5} URLs: {result['wall_seconds']:.2f}s{comparison}, {'ok' if result['succeeded'] else 'FAILED'}, peak RSS {result['peak_rss_mb']['self']} MB (children {result['peak_rss_mb']['children']} MB)")
+    print(f"    requests: {result['requests']}, injected errors: {result['injected_errors']}")
+    print(f"    stages: {', '.join(stages)}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        return run_pipeline(sys.argv[2], int(sys.argv[3]), sys.argv[4], sys.argv[5])
+
+    parser = argparse.ArgumentParser(description="Drive the URL and raw report pipelines end to end against local provider stand-ins")
+    parser.add_argument("--urls", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--flows", nargs="+", choices=flows, default=flows)
+    parser.add_argument("--latency-ms", action="append", help="Mean provider latency in ms, either for every provider or as provider=ms (firecrawl, spider, reader, llm, images, blob)")
+    parser.add_argument("--error-rate", action="append", help="Share of provider requests that fail, either for every provider or as provider=rate")
+    parser.add_argument("--port", type=int, default=18080, help="A fixed port keeps provider labels in the stage timings comparable across runs")
+    parser.add_argument("--output", help="Write the results as JSON, to compare them across commits")
+    parser.add_argument("--baseline", help="A JSON file written by --output on another commit")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    latencies = {provider: ms / 1000 for provider, ms in parse_setting(args.latency_ms or ["50", "llm=500"], 0).items()}
+    fake_providers = FakeProviders(latencies, parse_setting(args.error_rate, 0), port=args.port).start()
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = {(result["flow"], result["urls"]): result for result in json.load(f)["results"]}
+
+    results = []
+    for size in args.urls:
+        for flow in args.flows:
+            results.append(run_in_subprocess(flow, size, fake_providers, args.verbose))
+            print_result(results[-1], baseline)
+    fake_providers.stop()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"commit": get_commit(), "latencies": latencies, "error_rates": fake_providers.error_rates, "results": results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import random
+import re
+import time
+from export_to_word import process_lines
+
+chinese_dun_ordinal = r"[零一二三四五六七八九十百]+、.*"
+chinese_is_ordinal = r"[零一二三四五六七八九十百]+是.*"
+chinese_bracket_ordinal = r"（[零一二三四五六七八九十百]+）.*"
+arabic_dot_ordinal = r"(?:\d+\.)+(?!\d).*"
+chinese_dun_ordinal_full_stop = r"[零一二三四五六七八九十百]+、.*?。"
+chinese_is_ordinal_full_stop = r"[零一二三四五六七八九十百]+是.*?。"
+chinese_bracket_ordinal_full_stop = r"（[零一二三四五六七八九十百]+）.*?。"
+arabic_dot_ordinal_full_stop = r"(?:\d+\.)+(?!\d).*?。"
+
+ordinal = f"{chinese_dun_ordinal}|{chinese_is_ordinal}|{chinese_bracket_ordinal}|{arabic_dot_ordinal}"
+ordinal_full_stop = f"{chinese_dun_ordinal_full_stop}|{chinese_is_ordinal_full_stop}|{chinese_bracket_ordinal_full_stop}|{arabic_dot_ordinal_full_stop}"
+
+fuzz_alphabet = list("零一二三四五六七八九十百、是（）。.0123456789１٣ \n\t发展经济会议指出要加强ab") + ["一、", "（二）", "三是", "1.", "1.2.", "12.5", "。", "\n"]
+sample_lines = [
+    "一、总体要求。坚持稳中求进工作总基调，完整准确全面贯彻新发展理念。二、重点任务。（一）扩大内需。（二）稳定外贸。",
+    "会议指出，一是要加大宏观政策调控力度，二是要着力扩大国内需求，三是要推动科技创新和产业创新融合发展。",
+    "1.2. 数据来源 本文数据来自国家统计局，2024年GDP增长5.0%，同比增长12.5个百分点。",
+    "在统一大市场建设中，十一个部门联合发布了一系列措施，提出一揽子增量政策" * 40,
+    "temp-images/20250327 101010 abc123.png",
+]
+long_lines_without_full_stop = [
+    "一是加强统筹协调，二是完善政策体系，三是强化要素保障，四是优化营商环境，" * 200,
+    "（一）扩大有效投资；（二）促进消费升级；（三）稳定外贸外资；" * 200,
+]
+
+
+def process_lines_reference(body_content):
+    lines = []
+    for value in body_content.values():
+        text_chunks = re.split(f"({ordinal_full_stop})", value)
+        line = ""
+        for i, text_chunk in enumerate(text_chunks):
+            if re.match(f"^{ordinal_full_stop}$", text_chunk):
+                if line:
+                    lines.append(line.strip())
+                line = f"**{text_chunk.strip()}**"
+            elif re.match(f"^{ordinal}$", text_chunk):
+                if line:
+                    lines.append(line.strip())
+                line = f"**{text_chunk.strip()}**"
+            elif text_chunk.strip():
+                if i == 0:
+                    line = text_chunk.strip()
+                else:
+                    line += text_chunk.strip()
+        lines.append(line.strip())
+    return lines
+
+
+def fuzz(iterations, seed):
+    rnd = random.Random(seed)
+    for i in range(iterations):
+        body_content = {key: "".join(rnd.choice(fuzz_alphabet) for _ in range(rnd.randint(0, 40))) for key in range(1, rnd.randint(1, 4) + 1)}
+        expected, actual = process_lines_reference(body_content), process_lines(body_content)
+        if expected != actual:
+            raise SystemExit(f"Mismatch on {body_content!r}:\nexpected {expected!r}\nactual   {actual!r}")
+    print(f"fuzz: {iterations} random bodies identical to the reference")
+
+
+def measure(function, body_content, seconds):
+    count, start = 0, time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < seconds:
+        function(body_content)
+        count += 1
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz and benchmark the ordinal-heading segmenter in process_lines")
+    parser.add_argument("--fuzz", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    fuzz(args.fuzz, args.seed)
+    for name, lines in [("typical lines", sample_lines * 20), ("long lines without 。", long_lines_without_full_stop)]:
+        body_content = dict(enumerate(lines, 1))
+        characters = sum(len(value) for value in body_content.values())
+        reference = measure(process_lines_reference, body_content, args.seconds)
+        segmenter = measure(process_lines, body_content, args.seconds)
+        print(f"{name}: reference {reference * characters / 1e6:.2f} M chars/s, segmenter {segmenter * characters / 1e6:.2f} M chars/s ({segmenter / reference:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+import threading
+import time
+import ab_scheduler
+from ab_scheduler import run_tasks
+
+
+def sleep(seconds):
+    time.sleep(seconds)
+    return threading.current_thread().name
+
+
+def run_batch(lane, size, seconds):
+    start = time.perf_counter()
+    threads = {name for name, _, _ in run_tasks([(sleep, seconds)] * size, lane)}
+    return time.perf_counter() - start, len(threads)
+
+
+def check_growth(lane, seconds):
+    width = ab_scheduler.lane_workers[lane]
+    for size in [1, 2, width]:
+        elapsed, threads = run_batch(lane, size, seconds)
+        print(f"{lane}: {size:3d} tasks of {seconds}s took {elapsed:.2f}s on {threads} threads")
+    if elapsed > seconds * 2 or threads != width:
+        raise SystemExit(f"The {lane} lane did not grow to its width of {width} after smaller batches")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that scheduler lanes grow to their configured width")
+    parser.add_argument("--seconds", type=float, default=0.2)
+    args = parser.parse_args()
+    for lane in ["image", "scrape"]:
+        check_growth(lane, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
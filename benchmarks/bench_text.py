@@ -0,0 +1,268 @@
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import time
+import tracemalloc
+from docx import Document
+from docx.shared import Pt
+from scraper import purify, tidy, get_lines, get_lines_and_image_urls
+from export_to_word import process_lines, normalize_text_runs, re_halfwidth_quote, re_special_symbols, re_digits_letters_punctuation, re_space_after_chinese, re_space_before_chinese
+
+benchmarks_directory = os.path.dirname(os.path.abspath(__file__))
+corpus_directory = os.path.join(benchmarks_directory, "corpus")
+web_urls = {
+    "chinese_news.md": "https://www.news.cn/fortune/20251020/a1b2c3d4/c.html",
+    "english_news.md": "https://www.examplewire.com/markets/china-exporters-pivot-2025-03-27/",
+    "forum_thread.md": "https://bbs.example.com/thread-889900-1-1.html",
+    "policy_notice.md": "https://www.gov.example.cn/zhengce/content/2025-06/18/content_7012345.htm"
+}
+
+
+def get_paragraph_texts(raw):
+    return [value for value in process_lines(get_lines(tidy(raw))) if value]
+
+
+def get_paragraphs(raw):
+    doc = Document()
+    paragraphs = []
+    for text in get_paragraph_texts(raw):
+        paragraph = doc.add_paragraph()
+        for i, text_chunk in enumerate(text.split("**")):
+            if text_chunk:
+                run = paragraph.add_run(text_chunk)
+                run.bold = i % 2 == 1 or None
+                run.font.name = "宋体"
+                run.font.size = Pt(12)
+        paragraphs.append(paragraph)
+    return paragraphs
+
+
+def get_runs(paragraphs):
+    return [[(run.text, run.bold, run.font.name, run.font.size) for run in paragraph.runs] for paragraph in paragraphs]
+
+
+def copy_run_style(run, new_run):
+    new_run.bold = run.bold
+    new_run.font.name = run.font.name
+    new_run.font.size = run.font.size
+
+
+def replace_halfwidth_quotes_with_fullwidth(paragraph):
+    pattern = re_halfwidth_quote
+    opening_quote = True
+    new_runs = []
+    for run in paragraph.runs:
+        text = run.text
+        if text:
+            text_chunks = pattern.split(text)
+            quotes = pattern.findall(text)
+            for i, text_chunk in enumerate(text_chunks):
+                if text_chunk:
+                    new_runs.append((text_chunk, run))
+                if i < len(quotes):
+                    if opening_quote:
+                        new_runs.append(("“", run))
+                    else:
+                        new_runs.append(("”", run))
+                    opening_quote = not opening_quote
+    for run in paragraph.runs:
+        run.text = ""
+    for text_chunk, run in new_runs:
+        new_run = paragraph.add_run(text_chunk)
+        copy_run_style(run, new_run)
+
+
+def remove_special_symbols(paragraph):
+    pattern = re_special_symbols
+    new_runs = []
+    for run in paragraph.runs:
+        text = run.text
+        if text:
+            cleaned_text = pattern.sub("", text)
+            new_runs.append((cleaned_text, run))
+    for run in paragraph.runs:
+        run.text = ""
+    for cleaned_text, run in new_runs:
+        new_run = paragraph.add_run(cleaned_text)
+        copy_run_style(run, new_run)
+
+
+def change_digits_letters_punctuation_to_times_new_roman(paragraph):
+    pattern = re_digits_letters_punctuation
+    new_runs = []
+    for run in paragraph.runs:
+        text = run.text
+        if text:
+            text_chunks = pattern.split(text)
+            for i, text_chunk in enumerate(text_chunks):
+                if text_chunk:
+                    to_change = (i % 2 == 1)
+                    new_runs.append((text_chunk, run, to_change))
+    for run in paragraph.runs:
+        run.text = ""
+    for text_chunk, run, to_change in new_runs:
+        new_run = paragraph.add_run(text_chunk)
+        copy_run_style(run, new_run)
+        if to_change:
+            new_run.font.name = "Times New Roman"
+
+
+def remove_space_between_chinese_and_digits_letters_punctuation(paragraph):
+    pattern1 = re_space_after_chinese
+    pattern2 = re_space_before_chinese
+    new_runs = []
+    for run in paragraph.runs:
+        text = run.text
+        if text:
+            text = pattern1.sub(r"\1\2", text)
+            text = pattern2.sub(r"\1\2", text)
+            new_runs.append((text, run))
+    for run in paragraph.runs:
+        run.text = ""
+    for text, run in new_runs:
+        new_run = paragraph.add_run(text)
+        copy_run_style(run, new_run)
+
+
+def post_process(function):
+    def post_process_paragraphs(paragraphs):
+        for paragraph in paragraphs:
+            function(paragraph)
+    return post_process_paragraphs
+
+
+cases = {
+    "purify": (lambda raw, web_url: raw, purify, False, None),
+    "tidy": (lambda raw, web_url: raw, tidy, False, None),
+    "get_lines": (lambda raw, web_url: tidy(raw), get_lines, False, None),
+    "get_lines_and_image_urls": (lambda raw, web_url: (web_url, tidy(raw)), lambda arguments: get_lines_and_image_urls(*arguments), False, None),
+    "process_lines": (lambda raw, web_url: get_lines(tidy(raw)), process_lines, False, None),
+    "normalize_text_runs": (lambda raw, web_url: [(text, None, "宋体", Pt(12)) for text in get_paragraph_texts(raw)], normalize_text_runs, False, None),
+    **{function.__name__: (lambda raw, web_url: get_paragraphs(raw), post_process(function), True, get_runs) for function in [
+        replace_halfwidth_quotes_with_fullwidth,
+        remove_special_symbols,
+        change_digits_letters_punctuation_to_times_new_roman,
+        remove_space_between_chinese_and_digits_letters_punctuation
+    ]}
+}
+
+
+def get_pages():
+    pages = {}
+    for name in sorted(os.listdir(corpus_directory)):
+        if name in web_urls:
+            with open(os.path.join(corpus_directory, name), encoding="utf-8") as f:
+                pages[name] = f.read()
+    return pages
+
+
+def run_case(case, raw, web_url):
+    prepare, function, fresh, describe = cases[case]
+    arguments = prepare(raw, web_url)
+    result = function(arguments)
+    return json.dumps(describe(arguments) if describe else result, ensure_ascii=False, indent=1)
+
+
+def check_golden(pages, selected_cases, update, dump_directory):
+    golden_path = os.path.join(corpus_directory, "golden.json")
+    golden = {}
+    if os.path.exists(golden_path):
+        with open(golden_path, encoding="utf-8") as f:
+            golden = json.load(f)
+    mismatches = []
+    for name, raw in pages.items():
+        for case in selected_cases:
+            output = run_case(case, raw, web_urls[name])
+            digest = hashlib.sha256(output.encode()).hexdigest()
+            if dump_directory:
+                os.makedirs(dump_directory, exist_ok=True)
+                with open(os.path.join(dump_directory, f"{os.path.splitext(name)[0]} {case}.json"), "w", encoding="utf-8") as f:
+                    f.write(output)
+            if update:
+                golden.setdefault(name, {})[case] = digest
+            elif golden.get(name, {}).get(case) != digest:
+                mismatches.append(f"{case} on {name}")
+    if update:
+        with open(golden_path, "w", encoding="utf-8") as f:
+            json.dump(golden, f, indent=2)
+            f.write("\n")
+    if mismatches:
+        raise SystemExit(f"Output differs from the golden digests for: {', '.join(mismatches)}\nCompare --dump output from both commits, and run with --update-golden only if the change is intended")
+    print(f"golden: {len(pages)} pages x {len(selected_cases)} functions {'written' if update else 'match'}")
+
+
+def measure(case, raw, web_url, seconds, rounds):
+    prepare, function, fresh, describe = cases[case]
+    arguments = prepare(raw, web_url)
+    best = 0
+    for _ in range(rounds):
+        calls, elapsed = 0, 0.0
+        while elapsed < seconds / rounds:
+            if fresh and calls:
+                arguments = prepare(raw, web_url)
+            start = time.perf_counter()
+            function(arguments)
+            elapsed += time.perf_counter() - start
+            calls += 1
+        best = max(best, calls / elapsed)
+    arguments = prepare(raw, web_url)
+    tracemalloc.start()
+    function(arguments)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"ops": round(best, 2), "peak_kib": round(peak_bytes / 1024, 1)}
+
+
+def get_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=benchmarks_directory, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the text hot paths against golden outputs over the page corpus and measure their throughput")
+    parser.add_argument("--filter", default="", help="Only run functions whose name contains this text")
+    parser.add_argument("--seconds", type=float, default=0.5, help="Measuring time per function and page")
+    parser.add_argument("--rounds", type=int, default=5, help="The best round is reported, as in pytest-benchmark's min")
+    parser.add_argument("--update-golden", action="store_true")
+    parser.add_argument("--dump", help="Write every full output to this directory, to diff them across commits")
+    parser.add_argument("--save", help="Write the results as JSON, to compare them across commits")
+    parser.add_argument("--compare", help="A JSON file written by --save on another commit")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Fail when ops/sec drops by more than this percentage against --compare")
+    args = parser.parse_args()
+
+    pages = get_pages()
+    selected_cases = [case for case in cases if args.filter in case]
+    check_golden(pages, selected_cases, args.update_golden, args.dump)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results, regressions = {}, []
+    print(f"{'function':<60} {'page':<18} {'ops/sec':>10} {'MB/s':>8} {'peak KiB':>9} {'change':>8}")
+    for case in selected_cases:
+        results[case] = {}
+        for name, raw in pages.items():
+            result = results[case][name] = measure(case, raw, web_urls[name], args.seconds, args.rounds)
+            change = ""
+            if (previous := baseline.get(case, {}).get(name)):
+                percentage = (result["ops"] / previous["ops"] - 1) * 100
+                change = f"{percentage:+.1f}%"
+                if percentage < -args.threshold:
+                    regressions.append(f"{case} on {name} ({change})")
+            print(f"{case:<60} {name:<18} {result['ops']:>10.1f} {result['ops'] * len(raw.encode()) / 1e6:>8.2f} {result['peak_kib']:>9.1f} {change:>8}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"commit": get_commit(), "results": results}, f, ensure_ascii=False, indent=2)
+    if regressions:
+        raise SystemExit(f"Slower than the baseline by more than {args.threshold:g}%: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from io import BytesIO
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.etree import ElementTree
+from PIL import Image
+
+azurite_account = "devstoreaccount1"
+azurite_key = "Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq/K1SZFPTOtr/KBHBeksoGMGw=="
+providers = ["firecrawl", "spider", "reader", "llm", "images", "blob"]
+
+re_web_content_keys = re.compile(r"[{,] (\d+): ")
+re_web_urls = re.compile(r"https?://[^\s\"'<>]+")
+re_tag_filter = re.compile(r"\"([^\"]+)\"\s*=\s*'([^']*)'")
+re_chat_completions = re.compile(r"^/(?:v1|openai/deployments/[^/]+)/chat/completions$")
+
+regions = ["北京", "上海", "广东", "浙江", "江苏", "四川", "湖北", "山东", "福建", "河南", "重庆", "天津"]
+subjects = ["制造业企业", "消费市场", "外贸进出口", "新能源汽车", "数字经济", "基础设施投资", "房地产市场", "服务业", "高新技术产业", "农业生产", "金融机构", "中小企业"]
+actions = ["保持稳定增长", "加快转型升级", "持续回暖", "实现较快发展", "承压前行", "稳中有进", "呈现结构性分化", "释放新的活力"]
+details = ["前三季度同比增长{}%", "新增订单{}万笔", "累计投资{}亿元", "带动就业{}万人", "出口额达到{}亿美元", "环比提高{}个百分点"]
+english = ["Officials said output rose {}% as demand recovered.", "Analysts expect {} new projects to start this quarter.", "The ministry approved {} billion yuan of special bonds.", "Exporters shipped {} thousand units to new markets."]
+sources = ["新华社", "人民日报", "经济日报", "Reuters", "Financial Times"]
+
+
+def parse_setting(values, default):
+    settings = dict.fromkeys(providers, default)
+    for value in values or []:
+        name, _, number = value.rpartition("=")
+        for provider in ([name] if name else providers):
+            settings[provider] = float(number)
+    return settings
+
+
+def get_sentence(rnd):
+    if rnd.random() < 0.2:
+        return rnd.choice(english).format(rnd.randint(2, 999)) + " "
+    return f"{rnd.choice(regions)}{rnd.choice(subjects)}{rnd.choice(actions)}，{rnd.choice(details).format(rnd.randint(2, 999))}。"
+
+
+def get_image(index, size):
+    image = Image.new("RGB", size, ((index * 37) % 256, (index * 91) % 256, (index * 53) % 256))
+    for x in range(0, size[0], 40):
+        for y in range(index % 20, size[1], 40):
+            image.putpixel((x, y), (255, 255, 255))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class FakeProviders:
+    def __init__(self, latencies=None, error_rates=None, images_per_page=3, image_variety=50, paragraphs_per_page=12, seed=0, port=0):
+        self.latencies = latencies or dict.fromkeys(providers, 0.0)
+        self.error_rates = error_rates or dict.fromkeys(providers, 0.0)
+        self.images_per_page = images_per_page
+        self.image_variety = image_variety
+        self.paragraphs_per_page = paragraphs_per_page
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.requests = Counter()
+        self.errors = Counter()
+        self.counter_lock = threading.Lock()
+        self.images = {}
+        self.blobs = {}
+        self.blob_lock = threading.Lock()
+        self.port = port
+        self.server = None
+        self.url = None
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), FakeProviderHandler)
+        self.server.daemon_threads = True
+        self.server.request_queue_size = 1024
+        self.server.providers = self
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, name="fake-providers", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get_environment(self):
+        secrets = {"FIRECRAWL7": "fake", "FIRECRAWL8": "fake", "FIRECRAWL9": "fake", "SPIDER": "fake", "OPENROUTER": "fake", "EXCELLENCE2KEY": "fake", "EXCELLENCE2ENDPOINT": f"{self.url}/"}
+        return {
+            **{f"AB_SECRET_{name}": value for name, value in secrets.items()},
+            "YUSISTORAGE_CONNECTION_STRING": f"DefaultEndpointsProtocol=http;AccountName={azurite_account};AccountKey={azurite_key};BlobEndpoint={self.url}/{azurite_account};",
+            "AB_FIRECRAWL_URL": f"{self.url}/v1/scrape",
+            "AB_SPIDER_URL": f"{self.url}/crawl",
+            "AB_READER_URL": f"{self.url}/reader/",
+            "AB_OPENROUTER_URL": f"{self.url}/v1/chat/completions",
+            "AB_SCRAPE_INTERVAL_SECONDS": "0",
+            **{f"AB_RATE_LIMIT_{provider.upper()}": "0" for provider in ["firecrawl", "spider", "reader", "llm"]}
+        }
+
+    def get_requests(self):
+        with self.counter_lock:
+            return dict(self.requests), dict(self.errors)
+
+    def begin(self, provider):
+        with self.random_lock:
+            latency = self.latencies[provider] * self.random.uniform(0.5, 1.5)
+            failed = self.random.random() < self.error_rates[provider]
+        with self.counter_lock:
+            self.requests[provider] += 1
+            self.errors[provider] += failed
+        if latency:
+            time.sleep(latency)
+        return failed
+
+    def get_page(self, web_url, markdown=True):
+        rnd = random.Random(hashlib.md5(web_url.encode()).digest())
+        lines = [f"# {get_sentence(rnd)[:-1]}", f"来源：{rnd.choice(sources)}", f"{rnd.randint(2023, 2026)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} {rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}"]
+        image_every = max(1, self.paragraphs_per_page // max(1, self.images_per_page))
+        for i in range(self.paragraphs_per_page):
+            lines.append("".join(get_sentence(rnd) for _ in range(rnd.randint(2, 6))))
+            if i % image_every == 0 and i // image_every < self.images_per_page:
+                image_url = f"{self.url}/images/{rnd.randrange(self.image_variety)}.png"
+                lines.append(f"![]({image_url})" if markdown else image_url)
+                lines.append(f"图为{rnd.choice(sources)}记者拍摄的现场画面")
+        lines.append(f"[返回首页]({self.url}/) [分享]({web_url})")
+        return "\n\n".join(lines)
+
+    def get_completion(self, data):
+        user_message = next((message["content"] for message in reversed(data.get("messages", [])) if message.get("role") == "user"), "")
+        user_message = user_message if isinstance(user_message, str) else " ".join(part.get("text", "") for part in user_message)
+        rnd = random.Random(user_message)
+        if data.get("response_format"):
+            keys = [int(key) for key in re_web_content_keys.findall(user_message)] or [1]
+            message = {"role": "assistant", "content": json.dumps({
+                "title": get_sentence(rnd)[:-1],
+                "source": rnd.choice(sources),
+                "published_date": f"{rnd.randint(2023, 2026)}-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}",
+                "body_content_bounds": [min(keys[3:] or keys), max(keys)]
+            }, ensure_ascii=False)}
+        elif data.get("tools") and (web_urls := re_web_urls.findall(user_message)):
+            arguments = json.dumps({"search_results": {"宏观经济": web_urls}}, ensure_ascii=False)
+            message = {"role": "assistant", "content": None, "tool_calls": [{"id": f"call_{rnd.getrandbits(64):x}", "type": "function", "function": {"name": "online_articles_from_url_to_word", "arguments": arguments}}]}
+        else:
+            message = {"role": "assistant", "content": "已开始整理这些文章，文档生成后会在对话中提供下载链接。"}
+        return {
+            "id": f"chatcmpl-{rnd.getrandbits(64):x}",
+            "object": "chat.completion",
+            "model": data.get("model", "fake"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if "tool_calls" in message else "stop"}],
+            "usage": {"prompt_tokens": len(user_message) // 2, "completion_tokens": 60, "total_tokens": len(user_message) // 2 + 60}
+        }
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b"", content_type="application/json", headers=None):
+        body = json.dumps(body, ensure_ascii=False).encode() if isinstance(body, (dict, list)) else body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        headers = {"Content-Length": str(len(body)), **(headers or {})}
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_GET(self):
+        self.route()
+
+    def do_POST(self):
+        self.route()
+
+    def do_PUT(self):
+        self.route()
+
+    def do_HEAD(self):
+        self.route()
+
+    def route(self):
+        providers = self.server.providers
+        path = urlsplit(self.path).path
+        body = self.read_body()
+        if path.startswith(f"/{azurite_account}/"):
+            if providers.begin("blob"):
+                return self.send(500, "<Error><Code>InternalError</Code><Message>Injected failure</Message></Error>", "application/xml", {"x-ms-error-code": "InternalError"})
+            return self.blob(path, body)
+        provider = "firecrawl" if path == "/v1/scrape" else "spider" if path == "/crawl" else "reader" if path.startswith("/reader/") else "llm" if re_chat_completions.match(path) else "images" if path.startswith("/images/") else None
+        if provider is None:
+            return self.send(404, {"error": "not found"})
+        if providers.begin(provider):
+            return self.send(503 if provider == "images" else 500, {"error": "injected failure"})
+        if provider == "firecrawl":
+            self.send(200, {"success": True, "data": {"markdown": providers.get_page(json.loads(body)["url"])}})
+        elif provider == "spider":
+            web_url = json.loads(body)["url"]
+            self.send(200, [{"url": web_url, "content": providers.get_page(web_url), "status": 200}])
+        elif provider == "reader":
+            self.send(200, providers.get_page(unquote(self.path[len("/reader/"):])), "text/plain; charset=utf-8")
+        elif provider == "llm":
+            self.send(200, providers.get_completion(json.loads(body)))
+        else:
+            index = int(path.rsplit("/", 1)[-1].split(".")[0])
+            if index not in providers.images:
+                providers.images[index] = get_image(index, (640 + index % 5 * 160, 480 + index % 3 * 120))
+            self.send(200, providers.images[index], "image/png")
+
+    def blob(self, path, body):
+        providers = self.server.providers
+        query = parse_qs(urlsplit(self.path).query)
+        comp = query.get("comp", [""])[0]
+        headers = {"x-ms-request-id": str(time.time_ns()), "x-ms-version": "2025-01-05", "Date": formatdate(usegmt=True)}
+        with providers.blob_lock:
+            if self.command == "GET" and query.get("restype") == ["container"] and comp == "blobs":
+                container = path.split("/")[2]
+                tag_filter = dict(re_tag_filter.findall(query.get("where", [""])[0]))
+                matches = "".join(
+                    f"<Blob><Name>{escape(unquote(blob_path.split('/', 3)[3]))}</Name><ContainerName>{escape(container)}</ContainerName><Tags><TagSet>{''.join(f'<Tag><Key>{escape(key)}</Key><Value>{escape(value)}</Value></Tag>' for key, value in blob['tags'].items())}</TagSet></Tags></Blob>"
+                    for blob_path, blob in providers.blobs.items()
+                    if blob_path.split("/")[2] == container and blob.get("tags") and tag_filter.items() <= blob["tags"].items()
+                )
+                return self.send(200, f'<?xml version="1.0" encoding="utf-8"?><EnumerationResults><Blobs>{matches}</Blobs><NextMarker /></EnumerationResults>', "application/xml", headers)
+            blob = providers.blobs.setdefault(path, {"blocks": {}, "committed": [], "metadata": None}) if self.command == "PUT" else providers.blobs.get(path)
+            if self.command == "PUT" and query.get("restype") == ["container"]:
+                return self.send(201, "", "application/xml", headers)
+            if self.command == "PUT" and (copy_source := self.headers.get("x-ms-copy-source")):
+                source = providers.blobs.get(urlsplit(copy_source).path)
+                if source is None or source["metadata"] is None:
+                    return self.send(404, "<Error><Code>CannotVerifyCopySource</Code><Message>The specified blob does not exist.</Message></Error>", "application/xml", {**headers, "x-ms-error-code": "CannotVerifyCopySource"})
+                blob.update(blocks=dict(source["blocks"]), committed=list(source["committed"]), tags=dict(source.get("tags") or {}))
+                blob["metadata"] = {name[len("x-ms-meta-"):]: value for name, value in self.headers.items() if name.lower().startswith("x-ms-meta-")} or dict(source["metadata"])
+                if self.headers.get("x-ms-tags"):
+                    blob["tags"] = {key: values[0] for key, values in parse_qs(self.headers["x-ms-tags"]).items()}
+                return self.send(202, "", "application/xml", {**headers, "ETag": f'"{time.time_ns()}"', "Last-Modified": formatdate(usegmt=True), "x-ms-copy-id": str(time.time_ns()), "x-ms-copy-status": "success"})
+            if self.command == "PUT" and comp == "block":
+                blob["blocks"][query["blockid"][0]] = len(body)
+                return self.send(201, "", "application/xml", headers)
+            if self.command == "PUT" and comp == "blocklist":
+                blob["committed"] = [element.text for element in ElementTree.fromstring(body)]
+                blob["blocks"] = {block_id: size for block_id, size in blob["blocks"].items() if block_id in blob["committed"]}
+                blob["metadata"] = {name[len("x-ms-meta-"):]: value for name, value in self.headers.items() if name.lower().startswith("x-ms-meta-")}
+                blob["tags"] = {key: values[0] for key, values in parse_qs(self.headers.get("x-ms-tags", "")).items()}
+                return self.send(201, "", "application/xml", {**headers, "ETag": f'"{time.time_ns()}"', "Last-Modified": formatdate(usegmt=True)})
+            if blob is None or (self.command == "HEAD" and blob["metadata"] is None) or (comp == "blocklist" and not blob["blocks"]):
+                return self.send(404, "<Error><Code>BlobNotFound</Code><Message>The specified blob does not exist.</Message></Error>", "application/xml", {**headers, "x-ms-error-code": "BlobNotFound"})
+            if comp == "blocklist":
+                uncommitted = "".join(f"<Block><Name>{escape(block_id)}</Name><Size>{size}</Size></Block>" for block_id, size in blob["blocks"].items() if block_id not in blob["committed"])
+                return self.send(200, f'<?xml version="1.0" encoding="utf-8"?><BlockList><CommittedBlocks /><UncommittedBlocks>{uncommitted}</UncommittedBlocks></BlockList>', "application/xml", headers)
+            size = sum(blob["blocks"][block_id] for block_id in blob["committed"])
+            return self.send(200, b"\0" * size if self.command == "GET" else b"", "application/octet-stream", {
+                **headers,
+                "x-ms-blob-type": "BlockBlob",
+                "ETag": '"fake"',
+                "Last-Modified": formatdate(usegmt=True),
+                **({"Content-Length": str(size)} if self.command == "HEAD" else {}),
+                **{f"x-ms-meta-{name}": value for name, value in blob["metadata"].items()}
+            })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve local stand-ins for Firecrawl, Spider, Reader, OpenAI-compatible chat completions, image hosts and Azure Blob Storage")
+    parser.add_argument("--latency-ms", action="append", help=f"Mean latency in ms, either for every provider or as provider=ms; providers are {', '.join(providers)}")
+    parser.add_argument("--error-rate", action="append", help="Share of requests that fail, either for every provider or as provider=rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=0)
+    args = parser.parse_args()
+
+    fake_providers = FakeProviders({provider: ms / 1000 for provider, ms in parse_setting(args.latency_ms, 0).items()}, parse_setting(args.error_rate, 0), seed=args.seed, port=args.port).start()
+    for name, value in fake_providers.get_environment().items():
+        print(f"export {name}='{value}'")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print(fake_providers.get_requests())
+
+
+if __name__ == "__main__":
+    main()
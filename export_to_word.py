@@ -1,266 +1,416 @@
 import pandas as pd
 import ast
+import copy
+from functools import lru_cache
 from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
 from docx.shared import Inches
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn, nsdecls
+from docx.oxml.section import CT_SectPr
 import re
 import regex
 import string
+import os
+import hashlib
+import json
+import logging
+import multiprocessing
+from io import BytesIO
+from PIL import Image
+from lxml import etree
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from docxcompose.composer import Composer
 from ab_time import now_in_filename
+from ab_metrics import timer, count
+from ab_logging import log
+from ab_jobs import job_workers
 
-chinese_dun_ordinal = r"[零一二三四五六七八九十百]+、.*"
-chinese_is_ordinal = r"[零一二三四五六七八九十百]+是.*"
-chinese_bracket_ordinal = r"（[零一二三四五六七八九十百]+）.*"
-arabic_dot_ordinal = r"(?:\d+\.)+(?!\d).*"
-chinese_dun_ordinal_full_stop = r"[零一二三四五六七八九十百]+、.*?。"
-chinese_is_ordinal_full_stop = r"[零一二三四五六七八九十百]+是.*?。"
-chinese_bracket_ordinal_full_stop = r"（[零一二三四五六七八九十百]+）.*?。"
-arabic_dot_ordinal_full_stop = r"(?:\d+\.)+(?!\d).*?。"
+chinese_numerals = r"[零一二三四五六七八九十百]"
+chinese_dun_or_is_ordinal = rf"{chinese_numerals}+[、是]"
+chinese_bracket_ordinal = rf"（{chinese_numerals}+）"
+arabic_dot_ordinal = r"(?:\d+\.)+(?!\d)"
 
-ordinal = f"{chinese_dun_ordinal}|{chinese_is_ordinal}|{chinese_bracket_ordinal}|{arabic_dot_ordinal}"
-ordinal_full_stop = f"{chinese_dun_ordinal_full_stop}|{chinese_is_ordinal_full_stop}|{chinese_bracket_ordinal_full_stop}|{arabic_dot_ordinal_full_stop}"
+re_ordinal = re.compile(f"{chinese_dun_or_is_ordinal}|{chinese_bracket_ordinal}|{arabic_dot_ordinal}")
 
 digits_letters_punctuation = r"0-9A-Za-z" + re.escape(string.punctuation)
 
+re_halfwidth_quote = re.compile(r'"')
+re_special_symbols = regex.compile(r"[^\p{Letter}\p{Number}\p{Han}\p{Punctuation}\p{Math_Symbol}\p{Currency_Symbol}\p{Z}]")
+re_digits_letters_punctuation = re.compile(r"([" + digits_letters_punctuation + r"]+)")
+re_space_after_chinese = regex.compile(r"([\p{Han}])\s+([" + digits_letters_punctuation + r"])")
+re_space_before_chinese = regex.compile(r"([" + digits_letters_punctuation + r"])\s+([\p{Han}])")
+
+first_processed_paragraph = 6
+
+image_width = Inches(5.0)
+image_dpi = 150
+jpeg_quality = 85
+image_variants = {}
+article_cache_version = 1
+shard_workers = int(os.environ.get("AB_SHARD_WORKERS", max(1, (os.cpu_count() or 1) // job_workers)))
+min_parallel_articles = int(os.environ.get("AB_MIN_PARALLEL_ARTICLES", 60))
+
+start_template_path = "ab_doc_temps/info_search_temp_start.docx"
+end_template_path = "ab_doc_temps/info_search_temp_end.docx"
+
+
+def split_ordinal_chunks(value):
+    text_chunks = []
+    start = position = 0
+    full_stop = newline = -1
+    while (match := re_ordinal.search(value, position)):
+        if full_stop < match.end():
+            full_stop = value.find("。", match.end())
+            if full_stop == -1:
+                break
+        if newline < match.end():
+            newline = value.find("\n", match.end())
+            newline = len(value) if newline == -1 else newline
+        if newline < full_stop:
+            position = match.start() + 1
+            continue
+        text_chunks.extend([value[start:match.start()], value[match.start():full_stop + 1]])
+        start = position = full_stop + 1
+    text_chunks.append(value[start:])
+    return text_chunks
+
+
+def is_ordinal(text_chunk):
+    match = re_ordinal.match(text_chunk)
+    if match and match.group().endswith("."):
+        newline = text_chunk.find("\n", match.end())
+        return newline == -1 or newline == len(text_chunk) - 1
+    return bool(match)
+
 
 def process_lines(body_content):
-     lines = []
-     for value in body_content.values():
-         text_chunks = re.split(f"({ordinal_full_stop})", value)
-         line = ""
-         for i, text_chunk in enumerate(text_chunks):
-             if re.match(f"^{ordinal_full_stop}$", text_chunk):
-                 if line:
-                     lines.append(line.strip())
-                 line = f"**{text_chunk.strip()}**"
-             elif re.match(f"^{ordinal}$", text_chunk):
-                 if line:
-                     lines.append(line.strip())
-                 line = f"**{text_chunk.strip()}**"
-             elif text_chunk.strip():
-                 if i == 0:
-                     line = text_chunk.strip()
-                 else:
-                     line += text_chunk.strip()
-         lines.append(line.strip())
-     return lines
-
-
-def process_all_text_paragraphs(doc, *functions):
-    paragraphs = doc.paragraphs
-    for paragraph in paragraphs[6:]:
-        if any(run.text.strip() for run in paragraph.runs):
-            for function in functions:
-                function(paragraph)
-
-
-def copy_run_style(run, new_run):
-    new_run.bold = run.bold
-    new_run.font.name = run.font.name
-    new_run.font.size = run.font.size
-
-
-def replace_halfwidth_quotes_with_fullwidth(paragraph):
-    pattern = re.compile(r'"')
+    lines = []
+    for value in body_content.values():
+        line = ""
+        for i, text_chunk in enumerate(split_ordinal_chunks(value)):
+            if is_ordinal(text_chunk):
+                if line:
+                    lines.append(line.strip())
+                line = f"**{text_chunk.strip()}**"
+            elif text_chunk.strip():
+                if i == 0:
+                    line = text_chunk.strip()
+                else:
+                    line += text_chunk.strip()
+        lines.append(line.strip())
+    return lines
+
+
+def normalize_text_runs(text_runs):
     opening_quote = True
-    new_runs = []
-    for run in paragraph.runs:
-        text = run.text
-        if text:
-            text_chunks = pattern.split(text)
-            quotes = pattern.findall(text)
-            for i, text_chunk in enumerate(text_chunks):
-                if text_chunk:
-                    new_runs.append((text_chunk, run))
-                if i < len(quotes):
-                    if opening_quote:
-                        new_runs.append(("“", run))
-                    else:
-                        new_runs.append(("”", run))
-                    opening_quote = not opening_quote
-    for run in paragraph.runs:
-        run.text = ""
-    for text_chunk, run in new_runs:
-        new_run = paragraph.add_run(text_chunk)
-        copy_run_style(run, new_run)
-
-
-def remove_special_symbols(paragraph):
-    pattern = regex.compile(r"[^\p{Letter}\p{Number}\p{Han}\p{Punctuation}\p{Math_Symbol}\p{Currency_Symbol}\p{Z}]")
-    new_runs = []
-    for run in paragraph.runs:
-        text = run.text
-        if text:
-            cleaned_text = pattern.sub("", text)
-            new_runs.append((cleaned_text, run))
-    for run in paragraph.runs:
-        run.text = ""
-    for cleaned_text, run in new_runs:
-        new_run = paragraph.add_run(cleaned_text)
-        copy_run_style(run, new_run)
-
-
-def change_digits_letters_punctuation_to_times_new_roman(paragraph):
-    pattern = re.compile(r"([" + digits_letters_punctuation + r"]+)")
-    new_runs = []
-    for run in paragraph.runs:
-        text = run.text
-        if text:
-            text_chunks = pattern.split(text)
-            for i, text_chunk in enumerate(text_chunks):
-                if text_chunk:
-                    to_change = (i % 2 == 1)
-                    new_runs.append((text_chunk, run, to_change))
-    for run in paragraph.runs:
-        run.text = ""
-    for text_chunk, run, to_change in new_runs:
-        new_run = paragraph.add_run(text_chunk)
-        copy_run_style(run, new_run)
-        if to_change:
-            new_run.font.name = "Times New Roman"
-
-
-def remove_space_between_chinese_and_digits_letters_punctuation(paragraph):
-    pattern1 = regex.compile(r"([\p{Han}])\s+([" + digits_letters_punctuation + r"])")
-    pattern2 = regex.compile(r"([" + digits_letters_punctuation + r"])\s+([\p{Han}])")
-    new_runs = []
-    for run in paragraph.runs:
-        text = run.text
-        if text:
-            text = pattern1.sub(r"\1\2", text)
-            text = pattern2.sub(r"\1\2", text)
-            new_runs.append((text, run))
-    for run in paragraph.runs:
-        run.text = ""
-    for text, run in new_runs:
-        new_run = paragraph.add_run(text)
-        copy_run_style(run, new_run)
+    normalized_runs = []
+    for text, bold, font_name, font_size in text_runs:
+        if not text:
+            continue
+        text_chunks = re_halfwidth_quote.split(text)
+        for i in range(1, len(text_chunks)):
+            text_chunks[i] = ("“" if opening_quote else "”") + text_chunks[i]
+            opening_quote = not opening_quote
+        text = re_special_symbols.sub("", "".join(text_chunks))
+        for i, text_chunk in enumerate(re_digits_letters_punctuation.split(text)):
+            if text_chunk:
+                text_chunk = re_space_before_chinese.sub(r"\1\2", re_space_after_chinese.sub(r"\1\2", text_chunk))
+                normalized_runs.append((text_chunk, bold, "Times New Roman" if i % 2 == 1 else font_name, font_size))
+    return normalized_runs
+
+
+def add_text_runs(paragraph, text_runs, normalize=True):
+    if normalize and any(text.strip() for text, bold, font_name, font_size in text_runs):
+        text_runs = normalize_text_runs(text_runs)
+    for text, bold, font_name, font_size in text_runs:
+        run = paragraph.add_run(text)
+        if bold is not None:
+            run.bold = bold
+        if font_name is not None:
+            run.font.name = font_name
+        if font_size is not None:
+            run.font.size = font_size
+
+
+def has_image(paragraph):
+    return next(paragraph._p.iter(qn("w:drawing")), None) is not None and any(run.text.strip() == "" and run.element.xpath(".//w:drawing") for run in paragraph.runs)
+
+
+def render_image_variant(image_path, width=image_width, dpi=image_dpi):
+    if os.path.exists(variant_path := image_variants.get((image_path, width, dpi), "")):
+        os.utime(variant_path)
+        return variant_path
+    try:
+        with open(image_path, "rb") as f:
+            image_data = f.read()
+        image = Image.open(BytesIO(image_data))
+        target_width = round(width.inches * dpi)
+        image_format = "PNG" if image.format == "PNG" else "JPEG"
+        variant_path = image_path if image.width <= target_width else f"temp-images/{hashlib.md5(image_data).hexdigest()} {target_width}w.{image_format.lower()}"
+        if not os.path.exists(variant_path):
+            image = image.resize((target_width, max(1, round(image.height * target_width / image.width))), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            if image_format == "PNG":
+                image.save(buffer, format="PNG", optimize=True)
+            else:
+                image.convert("RGB").save(buffer, format="JPEG", quality=jpeg_quality, optimize=True, progressive=True)
+            part_path = f"{variant_path}.{os.getpid()}.part"
+            with open(part_path, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(part_path, variant_path)
+        image_variants[(image_path, width, dpi)] = variant_path
+        return variant_path
+    except Exception as e:
+        log("render_image_variant_failed", logging.WARNING, image_path=image_path, error=e)
+        return image_path
+
+
+def center_paragraph(paragraph):
+    paragraph.paragraph_format.first_line_indent = Pt(0)
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
 
 def center_image_description_paragraphs(doc):
-    paragraphs = doc.paragraphs
-    for i, paragraph in enumerate(paragraphs):
-        if any(run.text.strip() == "" and run.element.xpath(".//w:drawing") for run in paragraph.runs):
-            prev_text_paragraph = None
-            j = i - 1
-            while j >= 0:
-                if paragraphs[j].text.strip():
-                    prev_text_paragraph = paragraphs[j]
-                    break
-                j -= 1
-
-            next_text_paragraph = None
-            j = i + 1
-            while j < len(paragraphs):
-                if paragraphs[j].text.strip():
-                    next_text_paragraph = paragraphs[j]
-                    break
-                j += 1
-
-            if prev_text_paragraph and "。" not in prev_text_paragraph.text:
-                prev_text_paragraph.paragraph_format.first_line_indent = Pt(0)
-                prev_text_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-            if next_text_paragraph and "。" not in next_text_paragraph.text:
-                next_text_paragraph.paragraph_format.first_line_indent = Pt(0)
-                next_text_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-
-def export_search_results_to_word(csv_path):
-    df = pd.read_csv(csv_path, encoding="utf-8")
-    valid_mask = (df["heading_2"].notna() & df["source"].notna() & df["published_date"].notna() & df["body_content"].notna())
-    doc = Document("ab_doc_temps/info_search_temp_start.docx")
-    written_heading_1 = set()
+    prev_text_paragraph = None
+    prev_text = ""
+    is_after_image = False
+    for paragraph in doc.paragraphs:
+        text = paragraph.text
+        if text.strip() and is_after_image:
+            is_after_image = False
+            if "。" not in text:
+                center_paragraph(paragraph)
+        if has_image(paragraph):
+            is_after_image = True
+            if prev_text_paragraph is not None and "。" not in prev_text:
+                center_paragraph(prev_text_paragraph)
+        if text.strip():
+            prev_text_paragraph = paragraph
+            prev_text = text
+
+
+def add_heading_1(doc, heading_1, paragraph_count):
+    paragraph = doc.add_paragraph()
+    paragraph_count += 1
+    add_text_runs(paragraph, [(heading_1, True, "楷体", Pt(22))], paragraph_count > first_processed_paragraph)
+    paragraph.style = doc.styles["Heading 1"]
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    return paragraph_count
+
+
+def add_article(doc, heading_2, source, published_date, body_content, paragraph_count):
+    paragraph = doc.add_paragraph()
+    paragraph_count += 1
+    add_text_runs(paragraph, [(heading_2, True, "楷体", Pt(15))], paragraph_count > first_processed_paragraph)
+    paragraph.style = doc.styles["Heading 2"]
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    paragraph.paragraph_format.space_after = Pt(6)
+
+    paragraph = doc.add_paragraph()
+    paragraph_count += 1
+    paragraph.style = "Normal"
+    add_text_runs(paragraph, [(source + " ", None, "宋体", Pt(12)), (published_date, None, "Times New Roman", Pt(12))], paragraph_count > first_processed_paragraph)
+    paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+    for value in body_content:
+        paragraph = doc.add_paragraph()
+        paragraph_count += 1
+        if value.startswith("temp-images"):
+            run = paragraph.add_run()
+            run.add_picture(render_image_variant(value), width=image_width)
+            paragraph.alignment = 1
+        else:
+            paragraph.style = "Normal"
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
+            paragraph.paragraph_format.first_line_indent = Pt(24)
+            paragraph.paragraph_format.line_spacing = 1.25
+
+            if "*" in value:
+                text_runs = []
+                for text_chunk in re.split(r"(\*\*.*?\*\*)", value):
+                    if text_chunk.startswith("**") and text_chunk.endswith("**"):
+                        text_runs.append((text_chunk[2:-2], True, None, None))
+                    else:
+                        text_runs.append((text_chunk.replace("*", ""), None, None, None))
+                text_runs[-1] = (*text_runs[-1][:2], "宋体", Pt(12))
+            else:
+                text_runs = [(value, None, "宋体", Pt(12))]
+            add_text_runs(paragraph, text_runs, paragraph_count > first_processed_paragraph)
+    return paragraph_count
+
 
-    for index, row in df[valid_mask].iterrows():
+def add_articles(doc, rows, written_heading_1, paragraph_count):
+    paragraph_offset = paragraph_count - len(doc.paragraphs)
+    for row in rows:
         try:
             heading_1 = row["heading_1"] if pd.notna(row["heading_1"]) else None
-            heading_2 = row["heading_2"]
-            source = row["source"]
-            published_date = row["published_date"]
-            body_content = ast.literal_eval(row["body_content"])
-            body_content = process_lines(body_content)
-
+            body_content = process_lines(ast.literal_eval(row["body_content"]))
             if heading_1 and heading_1 not in written_heading_1:
                 written_heading_1.add(heading_1)
-                paragraph = doc.add_paragraph()
-                run = paragraph.add_run(heading_1)
-                paragraph.style = doc.styles["Heading 1"]
-                run.font.name = "楷体"
-                run.font.size = Pt(22)
-                run.bold = True
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-            paragraph = doc.add_paragraph()
-            run = paragraph.add_run(heading_2)
-            paragraph.style = doc.styles["Heading 2"]
-            run.font.name = "楷体"
-            run.font.size = Pt(15)
-            run.bold = True
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            paragraph.paragraph_format.space_after = Pt(6)
-
-            paragraph = doc.add_paragraph()
-            paragraph.style = "Normal"
-            run_source = paragraph.add_run(source + " ")
-            run_source.font.name = "宋体"
-            run_source.font.size = Pt(12)
-            run_date = paragraph.add_run(published_date)
-            run_date.font.name = "Times New Roman"
-            run_date.font.size = Pt(12)
-            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-
-            for value in body_content:
-                if value.startswith("temp-images"):
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run()
-                    run.add_picture(value, width=Inches(5.0))
-                    paragraph.alignment = 1
-                else:
-                    paragraph = doc.add_paragraph()
-                    paragraph.style = "Normal"
-                    paragraph.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
-                    paragraph.paragraph_format.first_line_indent = Pt(24)
-                    paragraph.paragraph_format.line_spacing = 1.25
-
-                    if "*" in value:
-                        text_chunks = re.split(r"(\*\*.*?\*\*)", value)
-                        for text_chunk in text_chunks:
-                            if text_chunk.startswith("**") and text_chunk.endswith("**"):
-                                text_chunk = text_chunk[2:-2]
-                                run = paragraph.add_run(text_chunk)
-                                run.bold = True
-                            else:
-                                text_chunk = text_chunk.replace("*", "")
-                                run = paragraph.add_run(text_chunk)
-                    else:
-                        run = paragraph.add_run(value)
-                    run.font.name = "宋体"
-                    run.font.size = Pt(12)
+                paragraph_count = add_heading_1(doc, heading_1, paragraph_count)
+            paragraph_count = add_article(doc, row["heading_2"], row["source"], row["published_date"], body_content, paragraph_count)
         except Exception as e:
-            print(f"Error processing value: {e}")
+            log("article_failed", logging.ERROR, heading_2=row["heading_2"], error=e)
+            paragraph_count = len(doc.paragraphs) + paragraph_offset
+    return paragraph_count
+
 
-    process_all_text_paragraphs(doc, replace_halfwidth_quotes_with_fullwidth, remove_special_symbols, change_digits_letters_punctuation_to_times_new_roman, remove_space_between_chinese_and_digits_letters_punctuation)
-    center_image_description_paragraphs(doc)
+@lru_cache(maxsize=None)
+def load_template(template_path):
+    return Document(template_path)
 
-    doc_path = f"temp-data/{now_in_filename()}.docx"
-    doc.save(doc_path)
-    return doc_path
 
+def get_template(template_path):
+    return copy.deepcopy(load_template(template_path))
 
-def append_company_info_and_disclaimer(doc_path):
-    doc = Document(doc_path)
+
+def get_empty_template():
+    doc = get_template(start_template_path)
+    for element in list(doc.element.body):
+        if not isinstance(element, CT_SectPr):
+            doc.element.body.remove(element)
+    return doc
+
+
+def build_shard(rows, written_heading_1, paragraph_count):
+    doc = get_empty_template()
+    add_articles(doc, rows, written_heading_1, paragraph_count)
+    shard_path = f"temp-data/{now_in_filename()}.docx"
+    doc.save(shard_path)
+    return shard_path
+
+
+def build_document_in_parallel(rows, workers, articles_per_shard):
+    doc = get_template(start_template_path)
+    shards = []
+    written_heading_1 = set()
+    for i in range(0, len(rows), articles_per_shard):
+        shard_rows = rows[i:i + articles_per_shard]
+        shards.append((shard_rows, set(written_heading_1), len(doc.paragraphs) if i == 0 else first_processed_paragraph))
+        written_heading_1.update(row["heading_1"] for row in shard_rows if pd.notna(row["heading_1"]))
+    try:
+        with ProcessPoolExecutor(min(workers, len(shards)), mp_context=multiprocessing.get_context("spawn")) as executor:
+            shard_paths = list(executor.map(build_shard, *zip(*shards)))
+    except BrokenProcessPool as e:
+        log("shard_pool_broken", logging.WARNING, workers=workers, error=e)
+        add_articles(doc, rows, set(), len(doc.paragraphs))
+        return doc
+    composer = Composer(doc)
+    for shard_path in shard_paths:
+        composer.append(Document(shard_path))
+        os.remove(shard_path)
+    return doc
+
+
+def render_article_block(block_path, heading_2, source, published_date, body_content, paragraph_count):
+    doc = get_empty_template()
+    add_article(doc, heading_2, source, published_date, body_content, paragraph_count)
+    image_paths = {doc.part.get_or_add_image(image_path)[0]: image_path for image_path in (render_image_variant(value) for value in body_content if value.startswith("temp-images"))}
+    elements = [element for element in doc.element.body if not isinstance(element, CT_SectPr)]
+    block = {"xml": "".join(etree.tostring(element, encoding="unicode") for element in elements), "image_paths": image_paths}
+    part_path = f"{block_path}.{os.getpid()}.part"
+    with open(part_path, "w", encoding="utf-8") as f:
+        json.dump(block, f, ensure_ascii=False)
+    os.replace(part_path, block_path)
+    return block
+
+
+def get_article_block(heading_2, source, published_date, body_content, paragraph_count):
+    normalized_from = max(0, first_processed_paragraph - paragraph_count)
+    key = hashlib.md5(repr((article_cache_version, heading_2, source, published_date, body_content, normalized_from, image_width, image_dpi)).encode("utf-8")).hexdigest()
+    block_path = f"temp-data/article {key}.json"
+    try:
+        with open(block_path, encoding="utf-8") as f:
+            block = json.load(f)
+        for path in [block_path, *block["image_paths"].values()]:
+            os.utime(path)
+        return block, True
+    except (OSError, ValueError):
+        pass
+    return render_article_block(block_path, heading_2, source, published_date, body_content, paragraph_count), False
+
+
+def insert_article_block(doc, block):
+    rIds = {rId: doc.part.get_or_add_image(image_path)[0] for rId, image_path in block["image_paths"].items()}
+    body = parse_xml(f"<w:body {nsdecls('w', 'r', 'wp', 'a', 'pic')}>{block['xml']}</w:body>")
+    for blip in body.iter(qn("a:blip")):
+        blip.set(qn("r:embed"), rIds[blip.get(qn("r:embed"))])
+    elements = list(body)
+    sect_pr = doc.element.body.sectPr
+    for element in elements:
+        if sect_pr is not None:
+            sect_pr.addprevious(element)
+        else:
+            doc.element.body.append(element)
+    return sum(element.tag == qn("w:p") for element in elements)
+
+
+def renumber_drawings(doc):
+    for i, doc_pr in enumerate(doc.element.body.iter(qn("wp:docPr")), 1):
+        doc_pr.set("id", str(i))
+
+
+def build_document_incrementally(rows):
+    doc = get_template(start_template_path)
+    paragraph_count = len(doc.paragraphs)
+    written_heading_1 = set()
+    cached_count = 0
+    for row in rows:
+        try:
+            heading_1 = row["heading_1"] if pd.notna(row["heading_1"]) else None
+            body_content = process_lines(ast.literal_eval(row["body_content"]))
+            if heading_1 and heading_1 not in written_heading_1:
+                written_heading_1.add(heading_1)
+                paragraph_count = add_heading_1(doc, heading_1, paragraph_count)
+            block, is_cached = get_article_block(row["heading_2"], row["source"], row["published_date"], body_content, paragraph_count)
+            paragraph_count += insert_article_block(doc, block)
+            cached_count += is_cached
+        except Exception as e:
+            log("article_failed", logging.ERROR, heading_2=row["heading_2"], error=e)
+    renumber_drawings(doc)
+    count("article_blocks_reused", cached_count)
+    log("article_blocks_reused", reused=cached_count, articles=len(rows))
+    return doc
+
+
+def export_search_results_to_word(csv_path, workers=1, articles_per_shard=20, incremental=False):
+    with timer("export_search_results_to_word"):
+        df = pd.read_csv(csv_path, encoding="utf-8")
+        valid_mask = (df["heading_2"].notna() & df["source"].notna() & df["published_date"].notna() & df["body_content"].notna())
+        rows = df[valid_mask].to_dict("records")
+        with timer("add_articles"):
+            if incremental:
+                doc = build_document_incrementally(rows)
+            elif workers > 1 and len(rows) > articles_per_shard and len(rows) >= min_parallel_articles:
+                doc = build_document_in_parallel(rows, workers, articles_per_shard)
+            else:
+                doc = get_template(start_template_path)
+                add_articles(doc, rows, set(), len(doc.paragraphs))
+        count("articles_exported", len(rows))
+
+        with timer("center_image_description_paragraphs"):
+            center_image_description_paragraphs(doc)
+        with timer("append_company_info_and_disclaimer"):
+            append_company_info_and_disclaimer(doc)
+
+        doc_path = f"temp-data/{now_in_filename()}.docx"
+        with timer("save_document"):
+            doc.save(doc_path)
+        return doc_path
+
+
+def append_company_info_and_disclaimer(doc):
     doc.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
     composer = Composer(doc)
-    doc_to_append = Document("ab_doc_temps/info_search_temp_end.docx")
+    doc_to_append = get_template(end_template_path)
     composer.append(doc_to_append)
-    composer.save(doc_path)
+    return doc
 
 
 if __name__ == "__main__":
     csv_path = r""
     doc_path = export_search_results_to_word(csv_path)
-    append_company_info_and_disclaimer(doc_path)
     print(doc_path)
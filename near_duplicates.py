@@ -0,0 +1,67 @@
+import re
+import zlib
+import numpy as np
+from collections import defaultdict
+
+shingle_size = 5
+permutation_count = 128
+band_count = 16
+similarity_threshold = 0.8
+mersenne_prime = np.uint64((1 << 61) - 1)
+max_hash = np.uint64((1 << 32) - 1)
+
+random_state = np.random.RandomState(20250101)
+permutations_a = random_state.randint(1, 1 << 32, permutation_count, dtype=np.uint64)
+permutations_b = random_state.randint(0, 1 << 32, permutation_count, dtype=np.uint64)
+
+re_remove_whitespace = re.compile(r"\s+")
+
+
+def get_text(web_content):
+    return re_remove_whitespace.sub("", "".join(value for value in web_content.values() if not value.startswith(("temp-images", "http")))).lower()
+
+
+def get_shingle_hashes(text):
+    shingles = {text[i:i + shingle_size] for i in range(max(1, len(text) - shingle_size + 1))}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def get_signature(web_content):
+    text = get_text(web_content)
+    if not text:
+        return None
+    shingle_hashes = get_shingle_hashes(text)
+    signature = np.full(permutation_count, max_hash, dtype=np.uint64)
+    for i in range(0, len(shingle_hashes), 4096):
+        block = shingle_hashes[i:i + 4096]
+        hashes = (np.outer(permutations_a, block) + permutations_b[:, None]) % mersenne_prime & max_hash
+        signature = np.minimum(signature, hashes.min(axis=1))
+    return signature
+
+
+def find_root(parents, key):
+    while parents[key] != key:
+        parents[key] = parents[parents[key]]
+        key = parents[key]
+    return key
+
+
+def cluster_signatures(signatures):
+    keys = [key for key, signature in signatures.items() if signature is not None]
+    order = {key: i for i, key in enumerate(keys)}
+    rows_per_band = permutation_count // band_count
+    buckets = defaultdict(list)
+    for key in keys:
+        for band in range(band_count):
+            buckets[(band, signatures[key][band * rows_per_band:(band + 1) * rows_per_band].tobytes())].append(key)
+    parents = {key: key for key in keys}
+    for bucket in buckets.values():
+        for other in bucket[1:]:
+            root, other_root = find_root(parents, bucket[0]), find_root(parents, other)
+            if root != other_root and np.mean(signatures[bucket[0]] == signatures[other]) >= similarity_threshold:
+                root, other_root = sorted([root, other_root], key=order.get)
+                parents[other_root] = root
+    clusters = defaultdict(list)
+    for key in keys:
+        clusters[find_root(parents, key)].append(key)
+    return [cluster for cluster in clusters.values() if len(cluster) > 1]
@@ -1,24 +1,25 @@
 import re
 import regex
 from markdown_it import MarkdownIt
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
 from validators import url
 import requests
 import random
 from io import BytesIO
 from PIL import Image
 import hashlib
+import os
 import time
-from ab_time import now_in_filename
+import logging
 from ab_utils import retrieve, manage_thread
+from ab_metrics import timer
+from ab_logging import log
+from ab_rate_limiter import acquire, raise_for_rate_limit
 
-FIRECRAWL_API_KEYS = [
-    retrieve("Firecrawl7"),
-    retrieve("Firecrawl8"),
-    retrieve("Firecrawl9")
-]
-
-SPIDER_API_KEY = retrieve("Spider")
+firecrawl_api_key_names = ["Firecrawl7", "Firecrawl8", "Firecrawl9"]
+firecrawl_url = os.environ.get("AB_FIRECRAWL_URL", "https://api.firecrawl.dev/v1/scrape")
+spider_url = os.environ.get("AB_SPIDER_URL", "https://api.spider.cloud/crawl")
+reader_url = os.environ.get("AB_READER_URL", "https://r.jina.ai/")
 
 re_normalize_newlines = re.compile(r"\r\n?")
 re_remove_markdown_composite_links = re.compile(r"\s*[!@#]?\[(?:[^\[\]]*\[[^\]]*\][^\[\]]*|[^\[\]]*)\]\([^)]*\)")
@@ -26,6 +27,10 @@ re_remove_markdown_basic_links = re.compile(r"\s*\[[^\[\]]*\]\([^)]*\)")
 re_remove_html_tags = re.compile(r"<[^>]+>")
 re_remove_invalid_lines = regex.compile(r'^[^\p{Letter}\p{Number}\[\]\(\)]*$', flags=regex.MULTILINE)
 re_compress_newlines = re.compile(r"\n+")
+re_remove_amp_path = re.compile(r"(?:/amp/?|\.amp)$")
+
+tracking_parameters = {"fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "_ga", "spm", "scene", "isappinstalled", "share_token", "amp", "outputtype"}
+mobile_host_prefixes = ("www.", "m.", "mobile.", "wap.", "amp.")
 
 
 def purify(text):
@@ -45,6 +50,25 @@ def tidy(text):
     return text[:50000].strip()
 
 
+def canonicalize_url(web_url):
+    try:
+        parts = urlsplit(web_url.strip())
+        host = (parts.hostname or "").rstrip(".")
+        if not host:
+            return web_url.strip()
+        for prefix in mobile_host_prefixes:
+            if host.startswith(prefix) and host.count(".") > 1:
+                host = host[len(prefix):]
+                break
+        port = parts.port
+        netloc = f"{host}:{port}" if port and port not in (80, 443) else host
+        path = re_remove_amp_path.sub("", parts.path).rstrip("/") or "/"
+        query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if not key.lower().startswith("utm_") and key.lower() not in tracking_parameters))
+        return urlunsplit(("https", netloc, path, query, ""))
+    except Exception:
+        return web_url.strip()
+
+
 def get_lines_and_image_urls(web_url, web_content):
     lines = list(dict.fromkeys(line for line in (line.strip() for line in web_content.splitlines()) if line))
     md = MarkdownIt()
@@ -74,51 +98,70 @@ def get_lines(web_content):
     return dict(enumerate(lines, 1))
 
 
+def download_image(image_url):
+    try:
+        image = Image.open(BytesIO(requests.get(image_url, timeout=10).content))
+        if max(image.size) < 100:
+            return None
+        if min(image.size) > 1024:
+            ratio = 1024 / min(image.size)
+            image = image.resize((int(image.size[0] * ratio), int(image.size[1] * ratio)), Image.Resampling.LANCZOS)
+        image_format = image.format if image.format in ["JPEG", "PNG"] else "JPEG"
+        if image_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = BytesIO()
+        image.save(buffer, format=image_format)
+        return image_format, buffer.getvalue()
+    except Exception:
+        return False
+
+
 def get_images_and_insert_paths(web_content):
+    requests = [(download_image, value) for value in dict.fromkeys(web_content.values()) if url(value)]
+    images = {arguments[0]: result for result, name, arguments in manage_thread(requests, lane="image")}
     image_hashes = set()
     for key in list(web_content):
         value = web_content[key]
-        if url(value):
+        if value in images:
+            if images[value] is False:
+                continue
+            if images[value] is None:
+                del web_content[key]
+                continue
+            image_format, image_data = images[value]
+            image_hash = hashlib.md5(image_data).hexdigest()
+            if image_hash in image_hashes:
+                del web_content[key]
+                continue
+            image_hashes.add(image_hash)
+            image_path = f"temp-images/{image_hash}.{image_format.lower()}"
             try:
-                image = Image.open(BytesIO(requests.get(value, timeout=10).content))
-                if max(image.size) < 100:
-                    del web_content[key]
-                    continue
-                if min(image.size) > 1024:
-                    ratio = 1024 / min(image.size)
-                    image = image.resize((int(image.size[0] * ratio), int(image.size[1] * ratio)), Image.Resampling.LANCZOS)
-                image_format = image.format if image.format in ["JPEG", "PNG"] else "JPEG"
-                if image_format == "JPEG" and image.mode != "RGB":
-                    image = image.convert("RGB")
-                image_path = f"temp-images/{now_in_filename()}.{image_format.lower()}"
-                buffer = BytesIO()
-                image.save(buffer, format=image_format)
-                image_data = buffer.getvalue()
-                image_hash = hashlib.md5(image_data).hexdigest()
-                if image_hash in image_hashes:
-                    del web_content[key]
-                    continue
-                else:
-                    image_hashes.add(image_hash)
-                    with open(image_path, "wb") as f:
+                if not os.path.exists(image_path):
+                    part_path = f"{image_path}.{os.getpid()}.{id(image_data)}.part"
+                    with open(part_path, "wb") as f:
                         f.write(image_data)
-                    web_content[key] = image_path
+                    os.replace(part_path, image_path)
+                else:
+                    os.utime(image_path)
+                web_content[key] = image_path
             except Exception:
                 continue
     return web_content
 
 
 def parse_web_content(web_raw_content):
-    return get_images_and_insert_paths(get_lines(tidy(web_raw_content)))
+    web_content = get_lines(tidy(web_raw_content))
+    with timer("get_images_and_insert_paths"):
+        return get_images_and_insert_paths(web_content)
 
 
 def parse_web_contents(web_raw_contents):
     requests = [(parse_web_content, web_raw_content) for web_raw_content in (web_raw_contents if isinstance(web_raw_contents, list) else [web_raw_contents])]
-    return {arguments[0]: result for result, name, arguments in manage_thread(requests)}
+    return {arguments[0]: result for result, name, arguments in manage_thread(requests, lane="scrape")}
 
 
 def firecrawl(web_url, delay=1):
-    url = "https://api.firecrawl.dev/v1/scrape"
+    url = firecrawl_url
     payload = {
         "url": web_url,
         "formats": ["markdown"],
@@ -134,29 +177,33 @@ def firecrawl(web_url, delay=1):
             }
         ]
     }
-    for attempt, api_key in enumerate(random.sample(FIRECRAWL_API_KEYS, 3), 1):
+    for attempt, api_key in enumerate(random.sample([retrieve(name) for name in firecrawl_api_key_names], 3), 1):
         headers = {
             "Authorization": f"Bearer {api_key}",
         }
         try:
-            print(f"Sending request to {url}")
-            response = requests.post(url, json=payload, headers=headers).json()
+            acquire("firecrawl", api_key)
+            log("scrape_request", provider="firecrawl", web_url=web_url, attempt=attempt)
+            response = requests.post(url, json=payload, headers=headers)
+            raise_for_rate_limit("firecrawl", api_key, response)
+            response = response.json()
             content = response.get("data", {}).get("markdown")
             if content:
                 return content
         except Exception as e:
-            print(f"Firecrawl attempt {attempt} failed: {e}")
+            log("scrape_attempt_failed", logging.WARNING, provider="firecrawl", web_url=web_url, attempt=attempt, error=e)
             if attempt < 2:
                 time.sleep(delay)
                 delay *= 2
-    print("Firecrawl failed to get a valid response after maximum retries")
+    log("scrape_failed", logging.WARNING, provider="firecrawl", web_url=web_url)
     return None
 
 
 def spider(web_url, delay=1):
-    url = "https://api.spider.cloud/crawl"
+    url = spider_url
+    api_key = retrieve("Spider")
     headers = {
-        "Authorization": f"Bearer {SPIDER_API_KEY}",
+        "Authorization": f"Bearer {api_key}",
     }
     json_data = {
         "url": web_url,
@@ -165,44 +212,52 @@ def spider(web_url, delay=1):
     }
     for attempt in range(3):
         try:
-            print(f"Sending request to {url}")
-            response = requests.post(url, headers=headers, json=json_data, timeout=20).json()
+            acquire("spider", api_key)
+            log("scrape_request", provider="spider", web_url=web_url, attempt=attempt + 1)
+            response = requests.post(url, headers=headers, json=json_data, timeout=20)
+            raise_for_rate_limit("spider", api_key, response)
+            response = response.json()
             content = response[0].get("content")
             if content:
                 return content
         except Exception as e:
-            print(f"Spider attempt {attempt + 1} failed: {e}")
+            log("scrape_attempt_failed", logging.WARNING, provider="spider", web_url=web_url, attempt=attempt + 1, error=e)
             if attempt < 2:
                 time.sleep(delay)
                 delay *= 2
-    print("Spider failed to get a valid response after maximum retries")
+    log("scrape_failed", logging.WARNING, provider="spider", web_url=web_url)
     return None
 
 
 def reader(web_url, delay=1):
-    url = f"https://r.jina.ai/{web_url}"
+    url = f"{reader_url}{web_url}"
     for attempt in range(3):
         try:
-            print(f"Sending request to {url}")
+            acquire("reader")
+            log("scrape_request", provider="reader", web_url=web_url, attempt=attempt + 1)
             response = requests.get(url, timeout=20)
+            raise_for_rate_limit("reader", "", response)
             if response.text:
                 return response.text
         except Exception as e:
-            print(f"Reader attempt {attempt + 1} failed: {e}")
+            log("scrape_attempt_failed", logging.WARNING, provider="reader", web_url=web_url, attempt=attempt + 1, error=e)
             if attempt < 2:
                 time.sleep(delay)
                 delay *= 2
-    print("Reader failed to get a valid response after maximum retries")
+    log("scrape_failed", logging.WARNING, provider="reader", web_url=web_url)
     return None
 
 
 def scrape_web_content(web_url):
     for index, scraper in enumerate([firecrawl, spider]):
         try:
-            web_content = scraper(web_url)
+            with timer("scrape", scraper.__name__):
+                web_content = scraper(web_url)
             if web_content:
                 if len(web_content) >= 500 or index == len([firecrawl, spider]) - 1:
-                    return get_images_and_insert_paths(get_lines_and_image_urls(web_url, tidy(web_content)))
+                    web_content = get_lines_and_image_urls(web_url, tidy(web_content))
+                    with timer("get_images_and_insert_paths"):
+                        return get_images_and_insert_paths(web_content)
         except Exception:
             continue
     return None
@@ -210,13 +265,14 @@ def scrape_web_content(web_url):
 
 def scrape_web_contents(web_urls):
     requests = [(scrape_web_content, web_url) for web_url in (web_urls if isinstance(web_urls, list) else [web_urls])]
-    return {arguments[0]: result for result, name, arguments in manage_thread(requests)}
+    return {arguments[0]: result for result, name, arguments in manage_thread(requests, lane="scrape")}
 
 
 def scrape_web_text(web_url):
     for index, request in enumerate([reader, spider]):
         try:
-            web_text = request(web_url)
+            with timer("scrape", request.__name__):
+                web_text = request(web_url)
             if web_text:
                 if len(web_text) >= 500 or index == len([reader, spider]) - 1:
                     return purify(web_text)
@@ -227,4 +283,4 @@ def scrape_web_text(web_url):
 
 def scrape_web_texts(web_urls):
     requests = [(scrape_web_text, web_url) for web_url in (web_urls if isinstance(web_urls, list) else [web_urls])]
-    return {arguments[0]: result for result, name, arguments in manage_thread(requests)}
+    return {arguments[0]: result for result, name, arguments in manage_thread(requests, lane="scrape")}